@@ -1,21 +1,40 @@
 from __future__ import annotations
 
-import json
+import asyncio
+import hashlib
+import marshal
 import multiprocessing as mp
 import os
+import time
 import traceback
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
-
-from openai import OpenAI
-from pydantic import BaseModel, ValidationError
-
+from multiprocessing.context import BaseContext
+from multiprocessing.pool import Pool
+from multiprocessing.shared_memory import SharedMemory
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+from pydantic import BaseModel, Field, ValidationError
+
+from agents.llm_utils import (
+    astream_json_completion,
+    first_valid_result,
+    get_async_openai_client,
+    get_openai_client,
+    retry_with_exponential_backoff,
+    run_batch_job,
+    stream_json_completion,
+)
+from core.cache import LRUCache
 from core.models import (
     CodeOutput,
     FailureType,
     IntentClassificationOutput,
     OverallTestStatus,
     PlanningOutput,
+    SolutionApproach,
     TestCase,
     TestCaseType,
     TestFailure,
@@ -23,6 +42,37 @@ from core.models import (
 )
 
 
+# Kept as a module constant so every call and retry sends a byte-identical
+# prefix, which lets the API's automatic prompt caching reuse it.
+_TESTER_SYSTEM_PROMPT = (
+    "You are an adversarial test designer for a software engineering "
+    "assistant called CodePilot.\n\n"
+    "Your task is to design a set of tests for a single function based "
+    "on its conceptual contract. You must NOT write any code or "
+    "pseudocode, only JSON descriptions of tests.\n\n"
+    "Respond with a STRICT JSON object:\n\n"
+    "{\n"
+    '  \"test_cases\": [\n'
+    "    {\n"
+    '      \"id\": string,\n'
+    '      \"description\": string,\n'
+    '      \"input_payload\": any JSON value,\n'
+    '      \"expected_behavior\": string,\n'
+    '      \"type\": one of [\"unit\", \"edge\", \"stress\", \"property\"]\n'
+    "    },\n"
+    "    ... at least 6 test cases covering happy path, edge cases, "
+    "stress inputs, and property style checks ...\n"
+    "  ]\n"
+    "}\n\n"
+    "Important:\n"
+    "- Do NOT include code, pseudocode, or language specific APIs.\n"
+    "- Describe expected behavior in natural language.\n"
+    "- Use simple JSON types only (numbers, strings, lists, objects).\n"
+    "- The function has the signature: single input value -> single output value.\n"
+    "Output ONLY the JSON object, with no additional commentary."
+)
+
+
 @dataclass
 class AdversarialTesterConfig:
     """
@@ -33,23 +83,41 @@ class AdversarialTesterConfig:
         max_retries: Number of attempts to obtain a valid test suite.
         temperature: Sampling temperature for the model.
         per_test_timeout_seconds: Maximum wall-clock time per test execution.
+        max_tokens: Upper bound on tokens generated per completion.
+        request_timeout_seconds: Per-request timeout for the LLM client.
+        test_cache_size: Number of generated test suites memoized per agent.
+        test_cache_ttl_seconds: Lifetime of a memoized test suite.
+        test_cache_max_temperature: Generated suites are only memoized when
+            temperature is at or below this value, so exploratory runs keep
+            their diversity.
     """
 
     model: str = "gpt-4.1-mini"
     max_retries: int = 2
     temperature: float = 0.1
     per_test_timeout_seconds: float = 2.0
+    max_tokens: int = 2048
+    request_timeout_seconds: float = 30.0
+    test_cache_size: int = 128
+    test_cache_ttl_seconds: float = 3600.0
+    test_cache_max_temperature: float = 0.3
 
 
 class _GeneratedTests(BaseModel):
     """
     Internal helper model for validating LLM-generated test cases.
+
+    fail_fast stops validation at the first malformed case, so a bad
+    generation is rejected (and retried) without building the rest.
     """
 
-    test_cases: List[TestCase]
+    test_cases: List[TestCase] = Field(fail_fast=True)
 
 
-SAFE_BUILTINS: Dict[str, Any] = {
+# Read-only view of the allowed builtins. Executed code gets a plain dict copy
+# instead: CPython only takes the fast builtin lookup path when __builtins__
+# is an exact dict.
+SAFE_BUILTINS: Mapping[str, Any] = MappingProxyType({
     "len": len,
     "range": range,
     "min": min,
@@ -71,29 +139,141 @@ SAFE_BUILTINS: Dict[str, Any] = {
     "float": float,
     "str": str,
     "bool": bool,
-}
+})
+
+
+# Compiled (marshalled) code objects keyed by a digest of the source files, so
+# re-testing identical code skips compilation entirely.
+_COMPILED_SOURCES: LRUCache[bytes] = LRUCache(maxsize=32)
+
+# Plan/intent pairs whose contract summary is kept per tester.
+_CONTRACT_CACHE_SIZE = 32
+
+# Namespace populated once per pool worker by _init_worker and reused by every
+# test case dispatched to that worker.
+_WORKER_NAMESPACE: Dict[str, Any] = {}
+_WORKER_INIT_ERROR: Optional[str] = None
+
+# Shared with the parent: _run_case stamps its slot with time.monotonic() when
+# a case starts, so each case's timeout runs from its own start.
+_CASE_STARTS: Any = None
+
+
+def _source_digest(source_files: Dict[str, str]) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for path, content in sorted(source_files.items()):
+        digest.update(path.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(content.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _compile_source_files(source_files: Dict[str, str]) -> bytes:
+    """
+    Compile every source file once and return the marshalled code objects.
+
+    Compilation happens in the parent so that all pool workers share a single
+    compile; workers only unmarshal and execute the code objects. Filenames are
+    wrapped in angle brackets so tracebacks never go looking for them on disk.
+    """
+    key = _source_digest(source_files)
+    compiled = _COMPILED_SOURCES.get(key)
+    if compiled is None:
+        code_objects = [
+            compile(content, f"<{path}>", "exec")
+            for path, content in source_files.items()
+        ]
+        compiled = marshal.dumps(code_objects)
+        _COMPILED_SOURCES.put(key, compiled)
+    return compiled
+
+
+# Either the marshalled payload itself or the (name, size) of a shared memory
+# block holding it.
+_CompiledSourcesRef = Union[bytes, Tuple[str, int]]
+
+
+def _share_compiled_sources(compiled_sources: bytes) -> Optional[SharedMemory]:
+    """
+    Copy the compiled payload into a shared memory block so pool workers can
+    map it instead of each receiving a pickled copy through their init pipe.
+
+    Returns None if shared memory is unavailable (e.g. /dev/shm missing or
+    full); callers then pass the bytes inline.
+    """
+    try:
+        shm = SharedMemory(create=True, size=max(1, len(compiled_sources)))
+    except OSError:
+        return None
+    shm.buf[: len(compiled_sources)] = compiled_sources
+    return shm
+
+
+def _load_compiled_sources(ref: _CompiledSourcesRef) -> bytes:
+    if isinstance(ref, bytes):
+        return ref
+    name, size = ref
+    shm = SharedMemory(name=name)
+    try:
+        return bytes(shm.buf[:size])
+    finally:
+        shm.close()
+
+
+# Error traces travel back over the pool's result pipe; keep them bounded.
+_MAX_ERROR_TRACE_CHARS = 4096
+_MAX_ERROR_TRACE_FRAMES = 10
+
+
+def _format_error(exc: BaseException) -> str:
+    """
+    Render an exception as its message followed by at most
+    _MAX_ERROR_TRACE_FRAMES frames, capped at _MAX_ERROR_TRACE_CHARS.
+    """
+    trace = "".join(traceback.format_exception_only(type(exc), exc)) + "\n"
+    trace += "".join(traceback.format_tb(exc.__traceback__, limit=_MAX_ERROR_TRACE_FRAMES))
+    return trace[:_MAX_ERROR_TRACE_CHARS]
+
 
+def _init_worker(compiled_sources: _CompiledSourcesRef, case_starts: Any) -> None:
+    """
+    Pool initializer: execute the user's compiled code once into a
+    worker-global namespace.
 
-def _test_worker(
-    source_files: Dict[str, str],
+    Errors are recorded instead of raised; an exception escaping a Pool
+    initializer makes the pool respawn workers forever.
+    """
+    global _WORKER_NAMESPACE, _WORKER_INIT_ERROR, _CASE_STARTS
+    _CASE_STARTS = case_starts
+    try:
+        # Copied once per worker, so a rebinding only affects the code that
+        # made it and is gone with the worker.
+        namespace: Dict[str, Any] = {"__builtins__": dict(SAFE_BUILTINS)}
+        for code_object in marshal.loads(_load_compiled_sources(compiled_sources)):
+            exec(code_object, namespace, namespace)
+        _WORKER_NAMESPACE = namespace
+        _WORKER_INIT_ERROR = None
+    except Exception as exc:
+        _WORKER_NAMESPACE = {}
+        _WORKER_INIT_ERROR = _format_error(exc)
+
+
+def _run_case(
     entrypoint: str,
     input_payload: Any,
-    result_queue: mp.Queue,
-) -> None:
+    slot: int,
+) -> Tuple[str, Any, Optional[str]]:
     """
-    Execute the user's code in an isolated process and report the outcome.
+    Invoke the entrypoint for a single test case inside a pool worker.
 
-    This function:
-      - Executes all source files in a single namespace.
-      - Locates the entrypoint function.
-      - Invokes it with input_payload.
-      - Sends a tuple (status, output, error_trace) via result_queue.
+    Returns a tuple (status, output, error_trace).
     """
-    try:
-        namespace: Dict[str, Any] = {"__builtins__": SAFE_BUILTINS}
-        for _, content in source_files.items():
-            exec(content, namespace, namespace)
+    _CASE_STARTS[slot] = time.monotonic()
+    if _WORKER_INIT_ERROR is not None:
+        return "error", None, _WORKER_INIT_ERROR
 
+    try:
         # Entrypoint is expected to be in the form "module.function". We only
         # use the function name here, since all code was executed into a single
         # namespace for isolation.
@@ -104,16 +284,33 @@ def _test_worker(
                 f"Entrypoint '{entrypoint}' is not in the form 'module.function'."
             )
 
-        func = namespace.get(func_name)
+        func = _WORKER_NAMESPACE.get(func_name)
         if not callable(func):
             raise RuntimeError(
                 f"Entrypoint function '{func_name}' not found in executed code."
             )
 
         output = func(input_payload)
-        result_queue.put(("ok", output, None))
-    except Exception:
-        result_queue.put(("error", None, traceback.format_exc()))
+        return "ok", output, None
+    except Exception as exc:
+        return "error", None, _format_error(exc)
+
+
+def _mp_context() -> BaseContext:
+    """
+    Prefer the forkserver start method where available: workers fork from a
+    small, single-threaded server process instead of the (threaded) API
+    process, which keeps per-worker startup cheap and safe.
+
+    The forkserver preloads this module, so workers inherit it (and its
+    openai/pydantic imports) already initialized instead of importing it
+    again to resolve the pool initializer.
+    """
+    if "forkserver" in mp.get_all_start_methods():
+        ctx = mp.get_context("forkserver")
+        ctx.set_forkserver_preload([__name__])
+        return ctx
+    return mp.get_context()
 
 
 class AdversarialTesterAgent:
@@ -131,9 +328,21 @@ class AdversarialTesterAgent:
         self,
         client: OpenAI,
         config: Optional[AdversarialTesterConfig] = None,
+        async_client: Optional[AsyncOpenAI] = None,
     ) -> None:
         self._client = client
+        self._async_client = async_client
         self._config = config or AdversarialTesterConfig()
+        self._test_cache: LRUCache[List[TestCase]] = LRUCache(
+            maxsize=self._config.test_cache_size,
+            ttl_seconds=self._config.test_cache_ttl_seconds,
+        )
+        # Plan and intent are fixed for a whole run, so debug-loop passes
+        # reuse the contract; entries hold both objects to make the id key
+        # safe.
+        self._contracts: LRUCache[
+            Tuple[PlanningOutput, Optional[IntentClassificationOutput], str]
+        ] = LRUCache(maxsize=_CONTRACT_CACHE_SIZE)
 
     def test(
         self,
@@ -146,8 +355,19 @@ class AdversarialTesterAgent:
 
         If LLM-based test generation fails, falls back to a small deterministic
         test suite that exercises basic behaviors of the entrypoint function.
+
+        Generated suites are memoized by contract and entrypoint, so debug
+        iterations that only change the code re-run the same tests without
+        another LLM round-trip.
         """
-        contract_summary = self._build_contract_summary(planning, intent)
+        contract_summary = self._contract_for(planning, intent)
+
+        use_cache = self._use_test_cache()
+        cache_key = self._test_cache_key(contract_summary, code)
+        if use_cache:
+            cached = self._test_cache.get(cache_key)
+            if cached is not None:
+                return self._execute_tests(code, cached)
 
         last_error: Optional[Exception] = None
         tests: Optional[_GeneratedTests] = None
@@ -157,21 +377,139 @@ class AdversarialTesterAgent:
                     contract_summary=contract_summary,
                     code=code,
                 )
-                tests = _GeneratedTests.model_validate(raw_json)
+                tests = _GeneratedTests.model_validate_json(raw_json)
                 break
-            except (json.JSONDecodeError, ValidationError, KeyError, TypeError) as exc:
+            except (ValidationError, ValueError) as exc:
                 last_error = exc
                 continue
 
         if tests is None:
             tests = self._heuristic_fallback_tests(code, last_error)
+        elif use_cache:
+            self._test_cache.put(cache_key, tests.test_cases)
 
         return self._execute_tests(code, tests.test_cases)
 
+    async def atest(
+        self,
+        planning: PlanningOutput,
+        code: CodeOutput,
+        intent: Optional[IntentClassificationOutput],
+    ) -> TestingOutput:
+        """
+        Async counterpart of test() backed by the AsyncOpenAI client.
+
+        The suite is generated without blocking the event loop; execution
+        waits on the sandbox pool, so it runs in a worker thread.
+        """
+        async_client = self._async_client
+        if async_client is None:
+            raise RuntimeError(
+                "AdversarialTesterAgent.atest requires an AsyncOpenAI client."
+            )
+
+        contract_summary = self._contract_for(planning, intent)
+
+        use_cache = self._use_test_cache()
+        cache_key = self._test_cache_key(contract_summary, code)
+        if use_cache:
+            cached = self._test_cache.get(cache_key)
+            if cached is not None:
+                return await asyncio.to_thread(self._execute_tests, code, cached)
+
+        tests, last_error = await first_valid_result(
+            lambda: self._ainvoke_llm(async_client, contract_summary, code),
+            _GeneratedTests.model_validate_json,
+            attempts=self._config.max_retries + 1,
+            concurrency=1,
+        )
+        if tests is None:
+            tests = self._heuristic_fallback_tests(code, last_error)
+        elif use_cache:
+            self._test_cache.put(cache_key, tests.test_cases)
+
+        return await asyncio.to_thread(self._execute_tests, code, tests.test_cases)
+
+    def test_batch(
+        self,
+        jobs: Sequence[
+            Tuple[PlanningOutput, CodeOutput, Optional[IntentClassificationOutput]]
+        ],
+        poll_interval_seconds: float = 30.0,
+    ) -> List[TestingOutput]:
+        """
+        Test many (planning, code, intent) jobs, generating every uncached
+        suite with a single OpenAI Batch API submission.
+
+        Intended for offline sweeps where cost matters more than latency: the
+        call blocks until the batch completes. Each suite gets one generation
+        attempt and falls back to the heuristic suite if it is missing or
+        invalid; execution is the same as in test().
+        """
+        use_cache = self._use_test_cache()
+        contracts = [self._contract_for(planning, intent) for planning, _, intent in jobs]
+        suites: List[Optional[List[TestCase]]] = [
+            self._test_cache.get(self._test_cache_key(contract, code)) if use_cache else None
+            for contract, (_, code, _) in zip(contracts, jobs)
+        ]
+
+        to_generate = [index for index, suite in enumerate(suites) if suite is None]
+        raw_outputs = run_batch_job(
+            self._client,
+            [self._build_request(contracts[i], jobs[i][1]) for i in to_generate],
+            poll_interval_seconds=poll_interval_seconds,
+        )
+        for index, raw_json in zip(to_generate, raw_outputs):
+            code = jobs[index][1]
+            error: Optional[Exception] = None
+            if raw_json is not None:
+                try:
+                    test_cases = _GeneratedTests.model_validate_json(raw_json).test_cases
+                    if use_cache:
+                        self._test_cache.put(
+                            self._test_cache_key(contracts[index], code), test_cases
+                        )
+                    suites[index] = test_cases
+                    continue
+                except (ValidationError, ValueError) as exc:
+                    error = exc
+            suites[index] = self._heuristic_fallback_tests(code, error).test_cases
+
+        return [
+            self._execute_tests(code, suite or [])
+            for (_, code, _), suite in zip(jobs, suites)
+        ]
+
+    def _use_test_cache(self) -> bool:
+        return self._config.temperature <= self._config.test_cache_max_temperature
+
+    def _test_cache_key(self, contract_summary: str, code: CodeOutput) -> Tuple[str, str, str]:
+        return (self._config.model, contract_summary, code.entrypoint)
+
+    def _contract_for(
+        self,
+        planning: PlanningOutput,
+        intent: Optional[IntentClassificationOutput],
+    ) -> str:
+        key = (id(planning), id(intent))
+        cached = self._contracts.get(key)
+        if cached is not None and cached[0] is planning and cached[1] is intent:
+            return cached[2]
+
+        approaches_by_id = {a.id: a for a in planning.approaches}
+        contract = self._build_contract_summary(
+            planning,
+            intent,
+            approaches_by_id.get(planning.selected_approach_id),
+        )
+        self._contracts.put(key, (planning, intent, contract))
+        return contract
+
     def _build_contract_summary(
         self,
         planning: PlanningOutput,
         intent: Optional[IntentClassificationOutput],
+        selected: Optional[SolutionApproach],
     ) -> str:
         """
         Create a compact textual summary of the inferred input/output contract.
@@ -189,12 +527,6 @@ class AdversarialTesterAgent:
             assumptions = "; ".join(planning.assumptions[:5])
             lines.append(f"Key assumptions: {assumptions}")
 
-        selected = None
-        for approach in planning.approaches:
-            if approach.id == planning.selected_approach_id:
-                selected = approach
-                break
-
         if selected is not None:
             lines.append(f"Selected approach: {selected.name}")
             if selected.high_level_steps:
@@ -209,63 +541,59 @@ class AdversarialTesterAgent:
 
         return " ".join(lines)
 
-    def _invoke_llm(
-        self,
-        contract_summary: str,
-        code: CodeOutput,
-    ) -> Dict[str, Any]:
+    def _build_request(self, contract_summary: str, code: CodeOutput) -> Dict[str, Any]:
         """
-        Ask the LLM to propose a suite of test cases as pure JSON.
+        Build the chat.completions request body for one test generation.
         """
-        system_prompt = (
-            "You are an adversarial test designer for a software engineering "
-            "assistant called CodePilot.\n\n"
-            "Your task is to design a set of tests for a single function based "
-            "on its conceptual contract. You must NOT write any code or "
-            "pseudocode, only JSON descriptions of tests.\n\n"
-            "Respond with a STRICT JSON object:\n\n"
-            "{\n"
-            '  \"test_cases\": [\n'
-            "    {\n"
-            '      \"id\": string,\n'
-            '      \"description\": string,\n'
-            '      \"input_payload\": any JSON value,\n'
-            '      \"expected_behavior\": string,\n'
-            '      \"type\": one of [\"unit\", \"edge\", \"stress\", \"property\"]\n'
-            "    },\n"
-            "    ... at least 6 test cases covering happy path, edge cases, "
-            "stress inputs, and property style checks ...\n"
-            "  ]\n"
-            "}\n\n"
-            "Important:\n"
-            "- Do NOT include code, pseudocode, or language specific APIs.\n"
-            "- Describe expected behavior in natural language.\n"
-            "- Use simple JSON types only (numbers, strings, lists, objects).\n"
-            "- The function has the signature: single input value -> single output value.\n"
-            "Output ONLY the JSON object, with no additional commentary."
-        )
-
         user_prompt = (
             "Conceptual contract for the function under test:\n"
             f"{contract_summary}\n\n"
             f"Entrypoint: {code.entrypoint}\n"
         )
 
-        response = self._client.chat.completions.create(
-            model=self._config.model,
-            temperature=self._config.temperature,
-            messages=[
-                {"role": "system", "content": system_prompt},
+        return {
+            "model": self._config.model,
+            "temperature": self._config.temperature,
+            "max_tokens": self._config.max_tokens,
+            "response_format": {"type": "json_object"},
+            "messages": [
+                {"role": "system", "content": _TESTER_SYSTEM_PROMPT},
                 {"role": "user", "content": user_prompt},
             ],
-        )
+        }
+
+    @retry_with_exponential_backoff()
+    def _invoke_llm(
+        self,
+        contract_summary: str,
+        code: CodeOutput,
+    ) -> str:
+        """
+        Ask the LLM to propose a suite of test cases as pure JSON.
 
-        content = response.choices[0].message.content
-        if content is None:
-            raise ValueError("LLM returned empty content for adversarial testing.")
+        Returns the raw JSON text; parsing and validation happen in a single
+        pass via _GeneratedTests.model_validate_json.
+        """
+        return stream_json_completion(
+            self._client,
+            **self._build_request(contract_summary, code),
+        )
 
-        content = content.strip()
-        return json.loads(content)
+    @retry_with_exponential_backoff()
+    async def _ainvoke_llm(
+        self,
+        async_client: AsyncOpenAI,
+        contract_summary: str,
+        code: CodeOutput,
+    ) -> str:
+        """
+        Async variant of _invoke_llm; transient API errors are retried with
+        backoff.
+        """
+        return await astream_json_completion(
+            async_client,
+            **self._build_request(contract_summary, code),
+        )
 
     def _heuristic_fallback_tests(
         self,
@@ -314,54 +642,153 @@ class AdversarialTesterAgent:
 
         return _GeneratedTests(test_cases=cases)
 
+    def _create_pool(
+        self,
+        ctx: BaseContext,
+        compiled_sources: _CompiledSourcesRef,
+        case_starts: Any,
+        processes: int,
+    ) -> Pool:
+        """
+        Start a worker pool whose workers have already executed the user's code.
+        """
+        return ctx.Pool(
+            processes=processes,
+            initializer=_init_worker,
+            initargs=(compiled_sources, case_starts),
+        )
+
+    def _run_pending(
+        self,
+        code: CodeOutput,
+        pending: List[TestCase],
+        compiled_ref: _CompiledSourcesRef,
+        processes: int,
+        outcomes: Dict[str, Tuple[str, Any, Optional[str]]],
+    ) -> None:
+        """
+        Run the pending cases and record each result in outcomes.
+
+        Each case gets per_test_timeout_seconds from the moment a worker
+        starts it. A timed-out case means a worker is stuck in user code, so
+        the pool is torn down once the cases already running have finished
+        or timed out; cases that had not started are re-run on a fresh pool.
+        """
+        timeout = self._config.per_test_timeout_seconds
+        ctx = _mp_context()
+        while pending:
+            case_starts = ctx.RawArray("d", len(pending))
+            pool = self._create_pool(ctx, compiled_ref, case_starts, processes)
+            outstanding = [
+                (
+                    slot,
+                    case,
+                    pool.apply_async(
+                        _run_case,
+                        (code.entrypoint, case.input_payload, slot),
+                    ),
+                )
+                for slot, case in enumerate(pending)
+            ]
+            pending = []
+            timed_out = False
+            try:
+                while outstanding:
+                    now = time.monotonic()
+                    next_deadline = now + timeout
+                    still_running = []
+                    for slot, case, result in outstanding:
+                        if result.ready():
+                            try:
+                                outcomes[case.id] = result.get()
+                            except Exception:
+                                outcomes[case.id] = ("error", None, "No result returned.")
+                            continue
+                        started = case_starts[slot]
+                        if not started:
+                            if timed_out:
+                                # The pool is about to be torn down; run this
+                                # case on a fresh one instead.
+                                pending.append(case)
+                            else:
+                                still_running.append((slot, case, result))
+                            continue
+                        deadline = started + timeout
+                        if now >= deadline:
+                            # The worker is stuck in user code; the only way
+                            # to reclaim it is to tear the pool down.
+                            outcomes[case.id] = ("timeout", None, None)
+                            timed_out = True
+                            continue
+                        still_running.append((slot, case, result))
+                        next_deadline = min(next_deadline, deadline)
+                    outstanding = still_running
+                    if outstanding:
+                        outstanding[0][2].wait(max(0.0, next_deadline - time.monotonic()))
+            finally:
+                pool.terminate()
+                pool.join()
+
     def _execute_tests(
         self,
         code: CodeOutput,
         test_cases: List[TestCase],
     ) -> TestingOutput:
         """
-        Execute the given test cases in isolated processes and collect results.
+        Execute the given test cases in a sandboxed worker pool and collect
+        results.
+
+        The user's code is loaded once per worker by the pool initializer, so
+        each test case only pays for the call itself rather than for a fresh
+        process plus a re-exec of every source file. Cases are independent and
+        are dispatched concurrently across up to one worker per core.
         """
+        outcomes: Dict[str, Tuple[str, Any, Optional[str]]] = {}
+        timeout = self._config.per_test_timeout_seconds
+        processes = max(1, min(len(test_cases), os.cpu_count() or 1))
+
+        pending = list(test_cases)
+        compiled_sources = b""
+        try:
+            compiled_sources = _compile_source_files(code.source_files)
+        except (SyntaxError, ValueError) as exc:
+            # Code that does not compile fails every case; no need for a pool.
+            error_trace = _format_error(exc)
+            outcomes = {case.id: ("error", None, error_trace) for case in test_cases}
+            pending = []
+
+        shm = _share_compiled_sources(compiled_sources) if pending else None
+        compiled_ref: _CompiledSourcesRef = compiled_sources
+        if shm is not None:
+            compiled_ref = (shm.name, len(compiled_sources))
+        try:
+            self._run_pending(code, pending, compiled_ref, processes, outcomes)
+        finally:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+
         passed_ids: List[str] = []
         failed_ids: List[str] = []
         failures: List[TestFailure] = []
 
         for case in test_cases:
-            queue: mp.Queue = mp.Queue()
-            proc = mp.Process(
-                target=_test_worker,
-                args=(code.source_files, code.entrypoint, case.input_payload, queue),
-            )
-            proc.start()
-            proc.join(timeout=self._config.per_test_timeout_seconds)
-
-            if proc.is_alive():
-                proc.terminate()
-                proc.join()
+            status, output, error_trace = outcomes[case.id]
+            if status == "ok":
+                passed_ids.append(case.id)
+                # For now we do not perform semantic comparison against
+                # expected_behavior, which remains a descriptive field.
+            elif status == "timeout":
                 failed_ids.append(case.id)
                 failures.append(
                     TestFailure(
                         case_id=case.id,
                         failure_type=FailureType.TIMEOUT,
-                        error_message=(
-                            f"Test exceeded timeout of "
-                            f"{self._config.per_test_timeout_seconds} seconds."
-                        ),
+                        error_message=f"Test exceeded timeout of {timeout} seconds.",
                         stack_trace=None,
                         actual_output=None,
                     )
                 )
-                continue
-
-            try:
-                status, output, error_trace = queue.get_nowait()
-            except Exception:
-                status, output, error_trace = "error", None, "No result returned."
-
-            if status == "ok":
-                passed_ids.append(case.id)
-                # For now we do not perform semantic comparison against
-                # expected_behavior, which remains a descriptive field.
             else:
                 failed_ids.append(case.id)
                 failures.append(
@@ -402,6 +829,10 @@ def create_default_adversarial_tester() -> AdversarialTesterAgent:
     """
     model = os.getenv("CODEPILOT_TESTER_MODEL", AdversarialTesterConfig.model)
     config = AdversarialTesterConfig(model=model)
-    client = OpenAI()
-    return AdversarialTesterAgent(client=client, config=config)
+    timeout = httpx.Timeout(config.request_timeout_seconds, connect=5.0)
+    return AdversarialTesterAgent(
+        client=get_openai_client().with_options(timeout=timeout),
+        config=config,
+        async_client=get_async_openai_client().with_options(timeout=timeout),
+    )
 
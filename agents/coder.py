@@ -1,13 +1,25 @@
 from __future__ import annotations
 
-import json
 import os
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass
-from typing import Any, Dict, Optional
+from typing import Any, Awaitable, Dict, List, Optional, Sequence, Set, Tuple
 
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI, OpenAI
 from pydantic import ValidationError
 
+from agents.llm_utils import (
+    astream_json_completion,
+    dumps_json,
+    first_valid_result,
+    get_async_openai_client,
+    get_openai_client,
+    retry_with_exponential_backoff,
+    run_batch_job,
+    stream_json_completion,
+)
+from core.cache import LRUCache
 from core.models import (
     CodeOutput,
     DebugOutput,
@@ -17,6 +29,35 @@ from core.models import (
 )
 
 
+# Kept as a module constant so every call and retry sends a byte-identical
+# prefix, which lets the API's automatic prompt caching reuse it.
+_CODER_SYSTEM_PROMPT = (
+    "You are the coding component of a software engineering agent called "
+    "CodePilot.\n\n"
+    "Your ONLY task is to generate Python source code strictly according "
+    "to an existing engineering plan and, optionally, a single selected "
+    "fix proposal. You must NOT change the high level approach.\n\n"
+    "You MUST respond with a STRICT JSON object matching this schema:\n\n"
+    "{\n"
+    '  \"language\": \"python\",\n'
+    '  \"style_mode\": one of [\"readable\", \"competitive\", \"enterprise\"],\n'
+    '  \"source_files\": {\n'
+    '    \"relative_path.py\": \"full file contents as a string\",\n'
+    "    ... at least one file ...\n"
+    "  },\n"
+    '  \"entrypoint\": \"module.function_name\",\n'
+    '  \"notes_for_tester\": [list of short strings]\n'
+    "}\n\n"
+    "Strict requirements:\n"
+    "- language must be exactly \"python\".\n"
+    "- entrypoint must refer to a function that is defined and callable "
+    "in the generated code.\n"
+    "- Do NOT include markdown, comments outside the code strings, or any "
+    "text before or after the JSON.\n"
+    "- Do NOT restate the plan or provide explanations; only JSON.\n"
+)
+
+
 @dataclass
 class CoderConfig:
     """
@@ -26,11 +67,36 @@ class CoderConfig:
         model: Name of the chat completion model to use.
         max_retries: Number of attempts to obtain a valid, parseable response.
         temperature: Sampling temperature for the model.
+        max_tokens: Upper bound on tokens generated per completion.
+        request_timeout_seconds: Per-request timeout for the LLM client.
+        speculative_delay_seconds: If set, an attempt still running after
+            this many seconds is hedged by starting the next attempt in
+            parallel (at most two in flight); the first valid response wins.
+            None keeps attempts strictly sequential.
+        speculative_temperature_step: Temperature added per attempt number
+            when attempts run speculatively, so a parallel retry does not
+            simply reproduce the same output.
     """
 
     model: str
     max_retries: int = 2
     temperature: float = 0.1
+    max_tokens: int = 4096
+    request_timeout_seconds: float = 30.0
+    speculative_delay_seconds: Optional[float] = None
+    speculative_temperature_step: float = 0.1
+
+
+# SolutionApproach fields the coder needs; the rest (pros, cons, ...) only
+# matter to planning.
+_PLANNING_SUMMARY_FIELDS = {"id", "name", "high_level_steps", "complexity_estimate"}
+
+# Upper bound on concurrent completions per CoderAgent when speculating, to
+# stay well inside provider rate limits.
+_MAX_SPECULATIVE_INFLIGHT = 2
+
+# Plans whose prompt summary is kept per CoderAgent.
+_PLANNING_SUMMARY_CACHE_SIZE = 32
 
 
 class CoderAgent:
@@ -44,9 +110,26 @@ class CoderAgent:
       - Produce a CodeOutput instance via strict JSON-only LLM output.
     """
 
-    def __init__(self, client: OpenAI, config: CoderConfig) -> None:
+    def __init__(
+        self,
+        client: OpenAI,
+        config: CoderConfig,
+        async_client: Optional[AsyncOpenAI] = None,
+    ) -> None:
         self._client = client
+        self._async_client = async_client
         self._config = config
+        # The plan is fixed for a whole run, so debug-loop passes reuse its
+        # summary; entries hold the plan itself to make the id key safe.
+        self._planning_summaries: LRUCache[Tuple[PlanningOutput, Dict[str, Any]]] = (
+            LRUCache(maxsize=_PLANNING_SUMMARY_CACHE_SIZE)
+        )
+        self._executor: Optional[ThreadPoolExecutor] = None
+        if config.speculative_delay_seconds is not None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=_MAX_SPECULATIVE_INFLIGHT,
+                thread_name_prefix="coder-speculative",
+            )
 
     def code(
         self,
@@ -62,34 +145,95 @@ class CoderAgent:
         a deterministic minimal Python implementation that adheres to the
         planning intent at a high level.
         """
-        style_mode = self._resolve_style_mode(intent)
-        language_pref = self._resolve_language(intent)
-        fix_context = self._extract_selected_fix(debug)
+        style_mode, language_pref, prompt_kwargs = self._prepare_prompt(
+            planning, intent, debug
+        )
 
         last_error: Optional[Exception] = None
-        for _attempt in range(self._config.max_retries + 1):
-            try:
-                raw_json = self._invoke_llm(
-                    planning=planning,
-                    style_mode=style_mode,
-                    language_pref=language_pref,
-                    fix_context=fix_context,
-                )
-                code_output = CodeOutput.model_validate(raw_json)
-                # Extra safety: enforce language is python and at least one file.
-                if code_output.language != "python":
-                    raise ValueError("CoderAgent must produce language='python'.")
-                if not code_output.source_files:
-                    raise ValueError("CoderAgent must produce at least one source file.")
+        if self._executor is not None:
+            code_output, last_error = self._code_speculative(
+                self._executor, prompt_kwargs
+            )
+            if code_output is not None:
                 return code_output
-            except (json.JSONDecodeError, ValidationError, KeyError, TypeError, ValueError) as exc:
-                last_error = exc
-                continue
+        else:
+            for _attempt in range(self._config.max_retries + 1):
+                try:
+                    raw_json = self._invoke_llm(
+                        temperature=self._config.temperature,
+                        **prompt_kwargs,
+                    )
+                    return self._parse_code_output(raw_json)
+                except (ValidationError, ValueError) as exc:
+                    last_error = exc
+                    continue
 
         # Fallback: deterministic minimal implementation that satisfies the
         # CodeOutput schema and honors planning intent conceptually.
         return self._fallback_code(planning, style_mode, language_pref, last_error)
 
+    async def acode(
+        self,
+        planning: PlanningOutput,
+        intent: Optional[IntentClassificationOutput],
+        debug: Optional[DebugOutput],
+    ) -> CodeOutput:
+        """
+        Async counterpart of code() backed by the AsyncOpenAI client.
+
+        Attempts run one at a time. When speculative_delay_seconds is set they
+        are hedged like _code_speculative: the next attempt starts after a
+        failure or the delay, at most _MAX_SPECULATIVE_INFLIGHT run at once,
+        and each gets speculative_temperature_step more temperature per
+        attempt number. The first valid output wins.
+        """
+        async_client = self._async_client
+        if async_client is None:
+            raise RuntimeError("CoderAgent.acode requires an AsyncOpenAI client.")
+
+        style_mode, language_pref, prompt_kwargs = self._prepare_prompt(
+            planning, intent, debug
+        )
+        delay = self._config.speculative_delay_seconds
+        next_attempt = 0
+
+        def attempt() -> Awaitable[str]:
+            nonlocal next_attempt
+            temperature = self._config.temperature
+            if delay is not None:
+                temperature += self._config.speculative_temperature_step * next_attempt
+            next_attempt += 1
+            return self._ainvoke_llm(
+                async_client, temperature=temperature, **prompt_kwargs
+            )
+
+        code_output, last_error = await first_valid_result(
+            attempt,
+            self._parse_code_output,
+            attempts=self._config.max_retries + 1,
+            concurrency=_MAX_SPECULATIVE_INFLIGHT if delay is not None else 1,
+            hedge_delay=delay,
+        )
+        if code_output is not None:
+            return code_output
+        return self._fallback_code(planning, style_mode, language_pref, last_error)
+
+    def _prepare_prompt(
+        self,
+        planning: PlanningOutput,
+        intent: Optional[IntentClassificationOutput],
+        debug: Optional[DebugOutput],
+    ) -> Tuple[StyleMode, str, Dict[str, Any]]:
+        style_mode = self._resolve_style_mode(intent)
+        language_pref = self._resolve_language(intent)
+        prompt_kwargs: Dict[str, Any] = {
+            "planning_summary": self._planning_summary_for(planning),
+            "style_mode": style_mode,
+            "language_pref": language_pref,
+            "fix_context": self._extract_selected_fix(debug),
+        }
+        return style_mode, language_pref, prompt_kwargs
+
     def _resolve_style_mode(
         self,
         intent: Optional[IntentClassificationOutput],
@@ -135,56 +279,157 @@ class CoderAgent:
             "notes_for_coder": selected.notes_for_coder,
         }
 
-    def _invoke_llm(
+    def code_batch(
         self,
-        planning: PlanningOutput,
-        style_mode: StyleMode,
-        language_pref: str,
-        fix_context: Optional[Dict[str, Any]],
-    ) -> Dict[str, Any]:
+        jobs: Sequence[
+            Tuple[PlanningOutput, Optional[IntentClassificationOutput], Optional[DebugOutput]]
+        ],
+        poll_interval_seconds: float = 30.0,
+    ) -> List[CodeOutput]:
         """
-        Call the underlying LLM and return a parsed JSON object that should
-        validate as CodeOutput.
+        Generate code for many (planning, intent, debug) jobs with a single
+        OpenAI Batch API submission.
+
+        Intended for offline sweeps where cost matters more than latency: the
+        call blocks until the batch completes. Each job gets one attempt; jobs
+        whose response is missing or invalid fall back to the deterministic
+        implementation, as code() does once its retries are exhausted.
         """
-        system_prompt = (
-            "You are the coding component of a software engineering agent called "
-            "CodePilot.\n\n"
-            "Your ONLY task is to generate Python source code strictly according "
-            "to an existing engineering plan and, optionally, a single selected "
-            "fix proposal. You must NOT change the high level approach.\n\n"
-            "You MUST respond with a STRICT JSON object matching this schema:\n\n"
-            "{\n"
-            '  \"language\": \"python\",\n'
-            '  \"style_mode\": one of [\"readable\", \"competitive\", \"enterprise\"],\n'
-            '  \"source_files\": {\n'
-            '    \"relative_path.py\": \"full file contents as a string\",\n'
-            "    ... at least one file ...\n"
-            "  },\n"
-            '  \"entrypoint\": \"module.function_name\",\n'
-            '  \"notes_for_tester\": [list of short strings]\n'
-            "}\n\n"
-            "Strict requirements:\n"
-            "- language must be exactly \"python\".\n"
-            "- entrypoint must refer to a function that is defined and callable "
-            "in the generated code.\n"
-            "- Do NOT include markdown, comments outside the code strings, or any "
-            "text before or after the JSON.\n"
-            "- Do NOT restate the plan or provide explanations; only JSON.\n"
+        prepared = []
+        for planning, intent, debug in jobs:
+            style_mode = self._resolve_style_mode(intent)
+            language_pref = self._resolve_language(intent)
+            request = self._build_request(
+                temperature=self._config.temperature,
+                planning_summary=self._planning_summary_for(planning),
+                style_mode=style_mode,
+                language_pref=language_pref,
+                fix_context=self._extract_selected_fix(debug),
+            )
+            prepared.append((planning, style_mode, language_pref, request))
+
+        raw_outputs = run_batch_job(
+            self._client,
+            [request for _, _, _, request in prepared],
+            poll_interval_seconds=poll_interval_seconds,
         )
 
-        planning_summary = {
+        outputs: List[CodeOutput] = []
+        for (planning, style_mode, language_pref, _), raw_json in zip(prepared, raw_outputs):
+            error: Optional[Exception] = None
+            if raw_json is not None:
+                try:
+                    outputs.append(self._parse_code_output(raw_json))
+                    continue
+                except (ValidationError, ValueError) as exc:
+                    error = exc
+            outputs.append(self._fallback_code(planning, style_mode, language_pref, error))
+        return outputs
+
+    def _parse_code_output(self, raw_json: str) -> CodeOutput:
+        code_output = CodeOutput.model_validate_json(raw_json)
+        # Extra safety: enforce language is python and at least one file.
+        if code_output.language != "python":
+            raise ValueError("CoderAgent must produce language='python'.")
+        if not code_output.source_files:
+            raise ValueError("CoderAgent must produce at least one source file.")
+        return code_output
+
+    def _code_speculative(
+        self,
+        executor: ThreadPoolExecutor,
+        prompt_kwargs: Dict[str, Any],
+    ) -> Tuple[Optional[CodeOutput], Optional[Exception]]:
+        """
+        Run the retry budget with hedged attempts.
+
+        The next attempt is started as soon as one fails, or alongside a
+        slow attempt once speculative_delay_seconds elapse, with at most
+        _MAX_SPECULATIVE_INFLIGHT calls outstanding. Returns the first valid
+        output, or None and the last validation error.
+        """
+        total = self._config.max_retries + 1
+        inflight: Set["Future[str]"] = set()
+        next_attempt = 0
+        last_error: Optional[Exception] = None
+
+        def submit() -> None:
+            nonlocal next_attempt
+            temperature = (
+                self._config.temperature
+                + self._config.speculative_temperature_step * next_attempt
+            )
+            inflight.add(
+                executor.submit(self._invoke_llm, temperature=temperature, **prompt_kwargs)
+            )
+            next_attempt += 1
+
+        submit()
+        try:
+            while inflight:
+                done, _ = wait(
+                    inflight,
+                    timeout=self._config.speculative_delay_seconds,
+                    return_when=FIRST_COMPLETED,
+                )
+                inflight.difference_update(done)
+                for future in done:
+                    try:
+                        return self._parse_code_output(future.result()), None
+                    except (ValidationError, ValueError) as exc:
+                        last_error = exc
+                if next_attempt < total and len(inflight) < _MAX_SPECULATIVE_INFLIGHT:
+                    submit()
+        finally:
+            # Calls already running cannot be interrupted; their results are
+            # simply discarded.
+            for future in inflight:
+                future.cancel()
+        return None, last_error
+
+    def _planning_summary_for(self, planning: PlanningOutput) -> Dict[str, Any]:
+        cached = self._planning_summaries.get(id(planning))
+        if cached is not None and cached[0] is planning:
+            return cached[1]
+        summary = self._build_planning_summary(planning)
+        self._planning_summaries.put(id(planning), (planning, summary))
+        return summary
+
+    def _build_planning_summary(self, planning: PlanningOutput) -> Dict[str, Any]:
+        """
+        Summarize the plan for the prompt.
+
+        Only the selected approach is included: the coder must not switch
+        approaches, so the alternatives would only add prompt tokens on every
+        attempt. All approaches are sent if the selected id does not resolve.
+        """
+        selected = next(
+            (a for a in planning.approaches if a.id == planning.selected_approach_id),
+            None,
+        )
+        approaches = [selected] if selected is not None else planning.approaches
+        return {
             "selected_approach_id": planning.selected_approach_id,
             "approaches": [
-                {
-                    "id": a.id,
-                    "name": a.name,
-                    "high_level_steps": a.high_level_steps,
-                    "complexity_estimate": a.complexity_estimate,
-                }
-                for a in planning.approaches
+                a.model_dump(include=_PLANNING_SUMMARY_FIELDS) for a in approaches
             ],
         }
 
+    def _build_request(
+        self,
+        temperature: float,
+        planning_summary: Dict[str, Any],
+        style_mode: StyleMode,
+        language_pref: str,
+        fix_context: Optional[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        """
+        Build the chat.completions request body for one code generation.
+
+        The system prompt is constant and the payload is serialized with
+        sorted keys, so retries send an identical prompt and hit the API's
+        cached prefix.
+        """
         user_payload: Dict[str, Any] = {
             "planning": planning_summary,
             "style_preferences": {
@@ -195,23 +440,45 @@ class CoderAgent:
         if fix_context is not None:
             user_payload["selected_fix"] = fix_context
 
-        user_prompt = json.dumps(user_payload, ensure_ascii=False)
+        user_prompt = dumps_json(user_payload, sort_keys=True)
 
-        response = self._client.chat.completions.create(
-            model=self._config.model,
-            temperature=self._config.temperature,
-            messages=[
-                {"role": "system", "content": system_prompt},
+        return {
+            "model": self._config.model,
+            "temperature": temperature,
+            "max_tokens": self._config.max_tokens,
+            "response_format": {"type": "json_object"},
+            "messages": [
+                {"role": "system", "content": _CODER_SYSTEM_PROMPT},
                 {"role": "user", "content": user_prompt},
             ],
-        )
+        }
 
-        content = response.choices[0].message.content
-        if content is None:
-            raise ValueError("LLM returned empty content for code generation.")
+    @retry_with_exponential_backoff()
+    def _invoke_llm(self, temperature: float, **prompt_kwargs: Any) -> str:
+        """
+        Call the underlying LLM and return the raw JSON text that should
+        validate as CodeOutput.
+        """
+        return stream_json_completion(
+            self._client,
+            **self._build_request(temperature, **prompt_kwargs),
+        )
 
-        content = content.strip()
-        return json.loads(content)
+    @retry_with_exponential_backoff()
+    async def _ainvoke_llm(
+        self,
+        async_client: AsyncOpenAI,
+        temperature: float,
+        **prompt_kwargs: Any,
+    ) -> str:
+        """
+        Async variant of _invoke_llm; transient API errors are retried with
+        backoff.
+        """
+        return await astream_json_completion(
+            async_client,
+            **self._build_request(temperature, **prompt_kwargs),
+        )
 
     def _fallback_code(
         self,
@@ -264,6 +531,10 @@ def create_default_coder() -> CoderAgent:
     """
     model = os.getenv("CODEPILOT_CODER_MODEL", "gpt-4.1-mini")
     config = CoderConfig(model=model)
-    client = OpenAI()
-    return CoderAgent(client=client, config=config)
+    timeout = httpx.Timeout(config.request_timeout_seconds, connect=5.0)
+    return CoderAgent(
+        client=get_openai_client().with_options(timeout=timeout),
+        config=config,
+        async_client=get_async_openai_client().with_options(timeout=timeout),
+    )
 
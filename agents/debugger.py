@@ -1,13 +1,25 @@
 from __future__ import annotations
 
-import json
 import os
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
-
-from openai import OpenAI
-from pydantic import ValidationError
-
+from typing import Any, Dict, Final, FrozenSet, List, Optional, Sequence, Tuple
+
+from openai import AsyncOpenAI, OpenAI
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from agents.llm_utils import (
+    astream_json_completion,
+    cache_completion,
+    completion_cache_key,
+    dumps_json,
+    first_valid_result,
+    get_async_openai_client,
+    get_cached_completion,
+    get_openai_client,
+    retry_with_exponential_backoff,
+    run_batch_job,
+    stream_json_completion,
+)
 from core.models import (
     CodeOutput,
     DebugOutput,
@@ -20,6 +32,191 @@ from core.models import (
 )
 
 
+_DEBUGGER_SYSTEM_PROMPT = (
+    "You are a debugging assistant for a software engineering agent "
+    "called CodePilot.\n\n"
+    "You receive:\n"
+    "- A conceptual plan including explicit assumptions.\n"
+    "- A summary of failing tests.\n\n"
+    "Your task is ONLY to explain root causes and propose high level "
+    "fix strategies. You must NOT write code or pseudocode.\n\n"
+    "Respond with a STRICT JSON object matching this schema:\n\n"
+    "{\n"
+    '  \"root_causes\": [\n'
+    "    {\n"
+    '      \"id\": string,\n'
+    '      \"description\": string,\n'
+    '      \"failed_assumptions\": [list of strings drawn from or '
+    "referencing the planning assumptions],\n"
+    '      \"impacted_test_case_ids\": [list of failing test case ids]\n'
+    "    },\n"
+    "    ... at least one entry ...\n"
+    "  ],\n"
+    '  \"proposed_fixes\": [\n'
+    "    {\n"
+    '      \"id\": string,\n'
+    '      \"target_root_cause_ids\": [list of root_causes ids],\n'
+    '      \"description\": string,\n'
+    '      \"notes_for_coder\": [list of concrete but non code level '
+    "suggestions]\n"
+    "    },\n"
+    "    ... at least one entry ...\n"
+    "  ],\n"
+    '  \"selected_fix_id\": string or null,\n'
+    '  \"updated_code_result\": null,\n'
+    '  \"requires_user_input\": boolean\n'
+    "}\n\n"
+    "Important:\n"
+    "- Do NOT include code or pseudocode.\n"
+    "- Focus on conceptual explanations and guidance.\n"
+    "- When mapping to failed_assumptions, prefer using the exact text "
+    "of planning assumptions where applicable.\n"
+    "Output ONLY the JSON object with no additional commentary."
+)
+
+
+_FAILURES_ADAPTER: TypeAdapter[List[TestFailure]] = TypeAdapter(List[TestFailure])
+_FAILURE_PAYLOAD_FIELDS = {"__all__": {"case_id", "failure_type", "error_message"}}
+
+# Fixed-shape failure lines for the context summary.
+_FAILURE_WITH_CASE_TEMPLATE = (
+    "[case_id=%s, type=%s] description=%s, expected_behavior=%s, "
+    "failure_type=%s, error_message=%s"
+)
+_FAILURE_TEMPLATE = "[case_id=%s] failure_type=%s, error_message=%s"
+
+
+@dataclass(frozen=True)
+class _FallbackSpec:
+    """
+    Canned root cause and fix used by the heuristic fallback for one failure
+    type. Keywords are matched as substrings of lowercased planning
+    assumptions to pick the assumptions the failure most likely violated.
+    """
+
+    root_cause_description: str
+    keywords: FrozenSet[str]
+    fix_description: str
+    notes_for_coder: Tuple[str, ...]
+
+
+_LOGIC_FALLBACK = _FallbackSpec(
+    root_cause_description=(
+        "The solution returns incorrect results or raises errors for "
+        "some inputs, indicating a logic or boundary condition issue."
+    ),
+    keywords=frozenset({"edge", "empty", "valid"}),
+    fix_description=(
+        "Tighten handling of boundary conditions and validate "
+        "intermediate results against the problem's assumptions."
+    ),
+    notes_for_coder=(
+        "Add checks for empty or minimal inputs.",
+        "Verify index calculations and off by one boundaries.",
+    ),
+)
+
+# Failure types without an entry use _LOGIC_FALLBACK.
+_FALLBACK_TABLE: Dict[FailureType, _FallbackSpec] = {
+    FailureType.TIMEOUT: _FallbackSpec(
+        root_cause_description=(
+            "The solution appears to take too long on some inputs, "
+            "indicating potential performance or complexity issues."
+        ),
+        keywords=frozenset({"time", "performance", "complexity"}),
+        fix_description=(
+            "Review the algorithm and data structures to reduce the "
+            "amount of work performed on large inputs, and consider "
+            "early termination where appropriate."
+        ),
+        notes_for_coder=(
+            "Revisit the selected approach to confirm its expected time behaviour.",
+            "Look for nested loops or repeated traversals that can be simplified.",
+        ),
+    ),
+    FailureType.RESOURCE: _FallbackSpec(
+        root_cause_description=(
+            "The solution seems to exceed resource limits, suggesting "
+            "inefficient memory or data structure usage."
+        ),
+        keywords=frozenset({"memory", "space", "resource"}),
+        fix_description=(
+            "Reduce peak memory usage by avoiding unnecessary copies "
+            "and using more compact representations where possible."
+        ),
+        notes_for_coder=(
+            "Identify large intermediate structures that can be streamed or reused.",
+            "Ensure data structures are cleared when no longer needed.",
+        ),
+    ),
+}
+
+
+# The schema is sent as guidance with strict=False: strict structured outputs
+# require every property to be required, which DebugOutput's defaulted fields
+# do not satisfy. Built once at import.
+_DEBUG_RESPONSE_FORMAT: Dict[str, Any] = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "DebugOutput",
+        "schema": DebugOutput.model_json_schema(),
+        "strict": False,
+    },
+}
+
+
+# Appended to the single-item prompt when several independent debugging
+# problems are packed into one request by debug_many.
+_DEBUGGER_MANY_SYSTEM_PROMPT = _DEBUGGER_SYSTEM_PROMPT + (
+    "\n\nBatch mode: the user message is a JSON object "
+    '{"items": [{"idx": integer, "input": string}, ...]} where each input is '
+    "an independent debugging problem in the format described above.\n"
+    "Analyze every item separately and respond with a STRICT JSON object:\n\n"
+    "{\n"
+    '  \"results\": [\n'
+    '    {\"idx\": the item idx, \"output\": the JSON object described above '
+    "for that item},\n"
+    "    ... one entry per item ...\n"
+    "  ]\n"
+    "}\n\n"
+    "Output ONLY the JSON object with no additional commentary."
+)
+
+
+class _IndexedDebugOutput(BaseModel):
+    idx: int
+    output: DebugOutput
+
+
+class _DebugManyResponse(BaseModel):
+    """
+    Internal helper model for validating a packed debug_many reply.
+    """
+
+    results: List[_IndexedDebugOutput]
+
+
+# Returned for every run without failures; DebugOutput is frozen, so one
+# instance can be shared.
+_EMPTY_DEBUG_OUTPUT = DebugOutput(
+    root_causes=[],
+    proposed_fixes=[],
+    selected_fix_id=None,
+    updated_code_result=None,
+    requires_user_input=False,
+)
+
+
+def _without_code_result(debug_output: DebugOutput) -> DebugOutput:
+    """
+    Ensure we never accept updated_code_result from the model; code changes
+    are the responsibility of the CoderAgent.
+    """
+    if debug_output.updated_code_result is None:
+        return debug_output
+    return debug_output.model_copy(update={"updated_code_result": None})
+
+
 @dataclass
 class DebuggerConfig:
     """
@@ -29,11 +226,16 @@ class DebuggerConfig:
         model: Name of the chat completion model to use.
         max_retries: Number of attempts to obtain a valid, parseable response.
         temperature: Sampling temperature for the model.
+        async_concurrency: Maximum attempts adebug keeps in flight at once;
+            the first reply that validates wins. Every slot is filled up
+            front and each is a billed completion, so values above 1 trade
+            spend for latency.
     """
 
     model: str = "gpt-4.1-mini"
     max_retries: int = 2
     temperature: float = 0.1
+    async_concurrency: int = 1
 
 
 class DebuggerAgent:
@@ -50,8 +252,10 @@ class DebuggerAgent:
         self,
         client: OpenAI,
         config: Optional[DebuggerConfig] = None,
+        async_client: Optional[AsyncOpenAI] = None,
     ) -> None:
         self._client = client
+        self._async_client = async_client
         self._config = config or DebuggerConfig()
 
     def debug(
@@ -64,40 +268,189 @@ class DebuggerAgent:
         Produce a DebugOutput given testing results, planning artifacts, and code.
 
         If LLM-based analysis fails, a deterministic, heuristic DebugOutput is
-        generated instead.
+        generated instead. Validated replies to low-temperature requests are
+        cached process-wide, so an identical failure landscape is answered
+        without another LLM call.
         """
         # If there are no failed cases, return an empty debug result.
         if not testing.failed_cases:
-            return DebugOutput(
-                root_causes=[],
-                proposed_fixes=[],
-                selected_fix_id=None,
-                updated_code_result=None,
-                requires_user_input=False,
-            )
+            return _EMPTY_DEBUG_OUTPUT
 
         context = self._build_context_summary(testing, planning)
+        messages = self._build_messages(context, testing, planning)
+        cache_key = completion_cache_key(
+            self._config.model, self._config.temperature, messages
+        )
+        cached = get_cached_completion(cache_key)
+        if cached is not None:
+            return cached
 
         last_error: Optional[Exception] = None
         for _attempt in range(self._config.max_retries + 1):
             try:
-                raw_json = self._invoke_llm(
-                    context_summary=context,
-                    testing=testing,
-                    planning=planning,
-                )
-                debug_output = DebugOutput.model_validate(raw_json)
-                # Ensure we never accept updated_code_result from the model;
-                # code changes are the responsibility of the CoderAgent.
-                debug_output.updated_code_result = None
+                raw_json = self._invoke_llm(messages)
+                debug_output = self._parse_debug_output(raw_json)
+                cache_completion(cache_key, debug_output)
                 return debug_output
-            except (json.JSONDecodeError, ValidationError, KeyError, TypeError) as exc:
+            except (ValidationError, ValueError) as exc:
                 last_error = exc
                 continue
 
         # Fallback if LLM output cannot be validated.
         return self._heuristic_fallback(testing, planning, last_error)
 
+    async def adebug(
+        self,
+        testing: TestingOutput,
+        planning: PlanningOutput,
+        code: CodeOutput,
+    ) -> DebugOutput:
+        """
+        Async counterpart of debug() backed by the AsyncOpenAI client.
+
+        Attempts run one at a time by default. With config.async_concurrency
+        above 1, that many run concurrently and the first reply that
+        validates is returned; the remaining calls are cancelled. The total
+        number of attempts is still bounded by max_retries + 1.
+        """
+        async_client = self._async_client
+        if async_client is None:
+            raise RuntimeError("DebuggerAgent.adebug requires an AsyncOpenAI client.")
+
+        if not testing.failed_cases:
+            return self.debug(testing, planning, code)
+
+        context = self._build_context_summary(testing, planning)
+        messages = self._build_messages(context, testing, planning)
+        cache_key = completion_cache_key(
+            self._config.model, self._config.temperature, messages
+        )
+        cached = get_cached_completion(cache_key)
+        if cached is not None:
+            return cached
+
+        debug_output, last_error = await first_valid_result(
+            lambda: self._ainvoke_llm(async_client, messages),
+            self._parse_debug_output,
+            attempts=self._config.max_retries + 1,
+            concurrency=self._config.async_concurrency,
+        )
+        if debug_output is not None:
+            cache_completion(cache_key, debug_output)
+            return debug_output
+        return self._heuristic_fallback(testing, planning, last_error)
+
+    def debug_batch(
+        self,
+        jobs: Sequence[Tuple[TestingOutput, PlanningOutput, CodeOutput]],
+        poll_interval_seconds: float = 30.0,
+    ) -> List[DebugOutput]:
+        """
+        Debug many (testing, planning, code) jobs with a single OpenAI Batch
+        API submission.
+
+        Intended for offline triage where cost matters more than latency: the
+        call blocks until the batch completes. Jobs without failures and cache
+        hits never reach the batch. Each remaining job gets one attempt and
+        falls back to the heuristic analysis if its reply is missing or
+        invalid.
+        """
+        results: List[Optional[DebugOutput]] = []
+        pending: List[Tuple[int, Optional[str], List[Dict[str, str]]]] = []
+        for index, (testing, planning, code) in enumerate(jobs):
+            if not testing.failed_cases:
+                results.append(self.debug(testing, planning, code))
+                continue
+            context = self._build_context_summary(testing, planning)
+            messages = self._build_messages(context, testing, planning)
+            cache_key = completion_cache_key(
+                self._config.model, self._config.temperature, messages
+            )
+            cached = get_cached_completion(cache_key)
+            results.append(cached if cached is not None else None)
+            if cached is None:
+                pending.append((index, cache_key, messages))
+
+        raw_outputs = run_batch_job(
+            self._client,
+            [self._build_request(messages) for _, _, messages in pending],
+            poll_interval_seconds=poll_interval_seconds,
+        )
+
+        for (index, cache_key, _), raw_json in zip(pending, raw_outputs):
+            testing, planning, _code = jobs[index]
+            error: Optional[Exception] = None
+            if raw_json is not None:
+                try:
+                    debug_output = self._parse_debug_output(raw_json)
+                    cache_completion(cache_key, debug_output)
+                    results[index] = debug_output
+                    continue
+                except (ValidationError, ValueError) as exc:
+                    error = exc
+            results[index] = self._heuristic_fallback(testing, planning, error)
+
+        return [result for result in results if result is not None]
+
+    def debug_many(
+        self,
+        jobs: Sequence[Tuple[TestingOutput, PlanningOutput, CodeOutput]],
+    ) -> List[DebugOutput]:
+        """
+        Debug several independent (testing, planning, code) jobs with a single
+        chat request.
+
+        All failing jobs are packed into one user message and the model returns
+        one DebugOutput per item, so the system prompt and request overhead
+        are paid once instead of per job. Jobs without failures never reach
+        the model. Items missing from a validated reply, or every item if no
+        reply validates within max_retries, are debugged individually via
+        debug().
+        """
+        results: List[Optional[DebugOutput]] = [None] * len(jobs)
+        items: List[Dict[str, Any]] = []
+        for index, (testing, planning, code) in enumerate(jobs):
+            if not testing.failed_cases:
+                results[index] = self.debug(testing, planning, code)
+                continue
+            context = self._build_context_summary(testing, planning)
+            items.append(
+                {"idx": index, "input": self._build_user_prompt(context, testing, planning)}
+            )
+
+        if items:
+            request = {
+                "model": self._config.model,
+                "temperature": self._config.temperature,
+                "response_format": {"type": "json_object"},
+                "messages": [
+                    {"role": "system", "content": _DEBUGGER_MANY_SYSTEM_PROMPT},
+                    {"role": "user", "content": dumps_json({"items": items})},
+                ],
+            }
+            for _attempt in range(self._config.max_retries + 1):
+                try:
+                    raw_json = self._invoke_many_llm(request)
+                    response = _DebugManyResponse.model_validate_json(raw_json)
+                except (ValidationError, ValueError):
+                    continue
+                for entry in response.results:
+                    if 0 <= entry.idx < len(jobs) and results[entry.idx] is None:
+                        results[entry.idx] = _without_code_result(entry.output)
+                break
+
+        return [
+            result if result is not None else self.debug(*jobs[index])
+            for index, result in enumerate(results)
+        ]
+
+    @retry_with_exponential_backoff()
+    def _invoke_many_llm(self, request: Dict[str, Any]) -> str:
+        return stream_json_completion(self._client, **request)
+
+    def _parse_debug_output(self, raw_json: str) -> DebugOutput:
+        return _without_code_result(DebugOutput.model_validate_json(raw_json))
+
     def _build_context_summary(
         self,
         testing: TestingOutput,
@@ -116,119 +469,113 @@ class DebuggerAgent:
             assumptions = "; ".join(planning.assumptions[:5])
             lines.append(f"Key assumptions: {assumptions}")
 
-        # Provide a quick description of each failing case.
+        # Provide a quick description of the first few failing cases; only
+        # those are rendered, so only their test cases are looked up.
+        shown_failures = testing.failures[:5]
+        needed = {f.case_id for f in shown_failures}
         failure_descriptions: List[str] = []
-        tc_by_id: Dict[str, Any] = {tc.id: tc for tc in testing.test_cases}
-        for failure in testing.failures:
+        tc_by_id: Dict[str, Any] = {
+            tc.id: tc for tc in testing.test_cases if tc.id in needed
+        }
+        for failure in shown_failures:
             tc = tc_by_id.get(failure.case_id)
+            failure_type = failure.failure_type.value
             if tc is not None:
                 failure_descriptions.append(
-                    f"[case_id={tc.id}, type={tc.type.value}] "
-                    f"description={tc.description}, "
-                    f"expected_behavior={tc.expected_behavior}, "
-                    f"failure_type={failure.failure_type.value}, "
-                    f"error_message={failure.error_message}"
+                    _FAILURE_WITH_CASE_TEMPLATE
+                    % (
+                        tc.id,
+                        tc.type.value,
+                        tc.description,
+                        tc.expected_behavior,
+                        failure_type,
+                        failure.error_message,
+                    )
                 )
             else:
                 failure_descriptions.append(
-                    f"[case_id={failure.case_id}] "
-                    f"failure_type={failure.failure_type.value}, "
-                    f"error_message={failure.error_message}"
+                    _FAILURE_TEMPLATE
+                    % (failure.case_id, failure_type, failure.error_message)
                 )
 
         if failure_descriptions:
-            combined = " | ".join(failure_descriptions[:5])
+            combined = " | ".join(failure_descriptions)
             lines.append(f"Failure summary: {combined}")
 
         return " ".join(lines)
 
-    def _invoke_llm(
+    def _build_messages(
         self,
         context_summary: str,
         testing: TestingOutput,
         planning: PlanningOutput,
-    ) -> Dict[str, Any]:
+    ) -> List[Dict[str, str]]:
         """
-        Call the underlying LLM and return a parsed JSON object suitable for
-        DebugOutput.model_validate.
+        Build the chat messages shared by the sync and async call paths.
         """
-        system_prompt = (
-            "You are a debugging assistant for a software engineering agent "
-            "called CodePilot.\n\n"
-            "You receive:\n"
-            "- A conceptual plan including explicit assumptions.\n"
-            "- A summary of failing tests.\n\n"
-            "Your task is ONLY to explain root causes and propose high level "
-            "fix strategies. You must NOT write code or pseudocode.\n\n"
-            "Respond with a STRICT JSON object matching this schema:\n\n"
-            "{\n"
-            '  \"root_causes\": [\n'
-            "    {\n"
-            '      \"id\": string,\n'
-            '      \"description\": string,\n'
-            '      \"failed_assumptions\": [list of strings drawn from or '
-            "referencing the planning assumptions],\n"
-            '      \"impacted_test_case_ids\": [list of failing test case ids]\n'
-            "    },\n"
-            "    ... at least one entry ...\n"
-            "  ],\n"
-            '  \"proposed_fixes\": [\n'
-            "    {\n"
-            '      \"id\": string,\n'
-            '      \"target_root_cause_ids\": [list of root_causes ids],\n'
-            '      \"description\": string,\n'
-            '      \"notes_for_coder\": [list of concrete but non code level '
-            "suggestions]\n"
-            "    },\n"
-            "    ... at least one entry ...\n"
-            "  ],\n"
-            '  \"selected_fix_id\": string or null,\n'
-            '  \"updated_code_result\": null,\n'
-            '  \"requires_user_input\": boolean\n'
-            "}\n\n"
-            "Important:\n"
-            "- Do NOT include code or pseudocode.\n"
-            "- Focus on conceptual explanations and guidance.\n"
-            "- When mapping to failed_assumptions, prefer using the exact text "
-            "of planning assumptions where applicable.\n"
-            "Output ONLY the JSON object with no additional commentary."
+        return [
+            {"role": "system", "content": _DEBUGGER_SYSTEM_PROMPT},
+            {
+                "role": "user",
+                "content": self._build_user_prompt(context_summary, testing, planning),
+            },
+        ]
+
+    def _build_user_prompt(
+        self,
+        context_summary: str,
+        testing: TestingOutput,
+        planning: PlanningOutput,
+    ) -> str:
+        # Serialize minimal testing/planning context for the model straight to
+        # JSON: the failures are dumped by pydantic-core with only the fields
+        # the prompt needs, without building an intermediate dict per failure.
+        failed_cases_json = _FAILURES_ADAPTER.dump_json(
+            testing.failures,
+            include=_FAILURE_PAYLOAD_FIELDS,
+        ).decode("utf-8")
+        testing_summary = (
+            f'{{"failed_cases":{failed_cases_json},'
+            f'"assumptions":{dumps_json(planning.assumptions)}}}'
         )
 
-        # Serialize minimal testing/planning context for the model.
-        testing_summary = {
-            "failed_cases": [
-                {
-                    "case_id": f.case_id,
-                    "failure_type": f.failure_type.value,
-                    "error_message": f.error_message,
-                }
-                for f in testing.failures
-            ],
-            "assumptions": planning.assumptions,
-        }
-
-        user_prompt = (
+        return (
             "Context summary:\n"
             f"{context_summary}\n\n"
             "Structured data:\n"
-            f"{json.dumps(testing_summary, ensure_ascii=False)}"
+            f"{testing_summary}"
         )
 
-        response = self._client.chat.completions.create(
-            model=self._config.model,
-            temperature=self._config.temperature,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-        )
+    def _build_request(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        return {
+            "model": self._config.model,
+            "temperature": self._config.temperature,
+            "response_format": _DEBUG_RESPONSE_FORMAT,
+            "messages": messages,
+        }
 
-        content = response.choices[0].message.content
-        if content is None:
-            raise ValueError("LLM returned empty content for debugging.")
+    @retry_with_exponential_backoff()
+    def _invoke_llm(self, messages: List[Dict[str, str]]) -> str:
+        """
+        Stream the completion and return the first JSON object in it, stopping
+        as soon as that object closes; parsing and validation happen in a
+        single pass via DebugOutput.model_validate_json.
+        """
+        return stream_json_completion(self._client, **self._build_request(messages))
 
-        content = content.strip()
-        return json.loads(content)
+    @retry_with_exponential_backoff()
+    async def _ainvoke_llm(
+        self,
+        async_client: AsyncOpenAI,
+        messages: List[Dict[str, str]],
+    ) -> str:
+        """
+        Async variant of _invoke_llm; transient API errors are retried with
+        backoff.
+        """
+        return await astream_json_completion(
+            async_client, **self._build_request(messages)
+        )
 
     def _heuristic_fallback(
         self,
@@ -251,93 +598,33 @@ class DebuggerAgent:
 
         assumptions = planning.assumptions or []
         default_assumption = assumptions[0] if assumptions else "Unspecified assumption"
+        lowered_assumptions = [(a, a.lower()) for a in assumptions]
 
         for idx, (failure_type, failure_list) in enumerate(failures_by_type.items(), start=1):
             case_ids = [f.case_id for f in failure_list]
-
-            if failure_type == FailureType.TIMEOUT:
-                description = (
-                    "The solution appears to take too long on some inputs, "
-                    "indicating potential performance or complexity issues."
-                )
-                failed_assumptions = [
-                    a
-                    for a in assumptions
-                    if "time" in a.lower()
-                    or "performance" in a.lower()
-                    or "complexity" in a.lower()
-                ] or [default_assumption]
-            elif failure_type == FailureType.RESOURCE:
-                description = (
-                    "The solution seems to exceed resource limits, suggesting "
-                    "inefficient memory or data structure usage."
-                )
-                failed_assumptions = [
-                    a
-                    for a in assumptions
-                    if "memory" in a.lower()
-                    or "space" in a.lower()
-                    or "resource" in a.lower()
-                ] or [default_assumption]
-            else:
-                description = (
-                    "The solution returns incorrect results or raises errors for "
-                    "some inputs, indicating a logic or boundary condition issue."
-                )
-                failed_assumptions = [
-                    a
-                    for a in assumptions
-                    if "edge" in a.lower()
-                    or "empty" in a.lower()
-                    or "valid" in a.lower()
-                ] or [default_assumption]
+            spec = _FALLBACK_TABLE.get(failure_type, _LOGIC_FALLBACK)
+            failed_assumptions = [
+                a for a, lowered in lowered_assumptions
+                if any(k in lowered for k in spec.keywords)
+            ] or [default_assumption]
 
             rc_id = f"rc_{idx}"
             root_causes.append(
                 RootCauseAnalysis(
                     id=rc_id,
-                    description=description,
+                    description=spec.root_cause_description,
                     failed_assumptions=failed_assumptions,
                     impacted_test_case_ids=case_ids,
                 )
             )
 
-            if failure_type == FailureType.TIMEOUT:
-                fix_desc = (
-                    "Review the algorithm and data structures to reduce the "
-                    "amount of work performed on large inputs, and consider "
-                    "early termination where appropriate."
-                )
-                notes = [
-                    "Revisit the selected approach to confirm its expected time behaviour.",
-                    "Look for nested loops or repeated traversals that can be simplified.",
-                ]
-            elif failure_type == FailureType.RESOURCE:
-                fix_desc = (
-                    "Reduce peak memory usage by avoiding unnecessary copies "
-                    "and using more compact representations where possible."
-                )
-                notes = [
-                    "Identify large intermediate structures that can be streamed or reused.",
-                    "Ensure data structures are cleared when no longer needed.",
-                ]
-            else:
-                fix_desc = (
-                    "Tighten handling of boundary conditions and validate "
-                    "intermediate results against the problem's assumptions."
-                )
-                notes = [
-                    "Add checks for empty or minimal inputs.",
-                    "Verify index calculations and off by one boundaries.",
-                ]
-
             fix_id = f"fix_{idx}"
             proposed_fixes.append(
                 FixProposal(
                     id=fix_id,
                     target_root_cause_ids=[rc_id],
-                    description=fix_desc,
-                    notes_for_coder=notes,
+                    description=spec.fix_description,
+                    notes_for_coder=list(spec.notes_for_coder),
                 )
             )
 
@@ -352,16 +639,22 @@ class DebuggerAgent:
         )
 
 
+# Read once so factories called on hot paths skip the environment lookup.
+_DEBUGGER_MODEL: Final[str] = os.getenv("CODEPILOT_DEBUGGER_MODEL", DebuggerConfig.model)
+
+
 def create_default_debugger() -> DebuggerAgent:
     """
     Convenience factory that builds a DebuggerAgent using environment variables
     for configuration.
 
     Environment variables:
-      - CODEPILOT_DEBUGGER_MODEL: override default model name.
+      - CODEPILOT_DEBUGGER_MODEL: override default model name (read once at import).
     """
-    model = os.getenv("CODEPILOT_DEBUGGER_MODEL", DebuggerConfig.model)
-    config = DebuggerConfig(model=model)
-    client = OpenAI()
-    return DebuggerAgent(client=client, config=config)
+    config = DebuggerConfig(model=_DEBUGGER_MODEL)
+    return DebuggerAgent(
+        client=get_openai_client(),
+        config=config,
+        async_client=get_async_openai_client(),
+    )
 
@@ -1,13 +1,24 @@
 from __future__ import annotations
 
-import json
 import os
 from dataclasses import dataclass
-from typing import Any, Optional
+from typing import Any, Dict, Final, List, Optional, Sequence, Tuple
 
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 from pydantic import ValidationError
 
+from agents.llm_utils import (
+    astream_json_completion,
+    cache_completion,
+    completion_cache_key,
+    first_valid_result,
+    get_async_openai_client,
+    get_cached_completion,
+    get_openai_client,
+    retry_with_exponential_backoff,
+    run_batch_job,
+    stream_json_completion,
+)
 from core.models import (
     IntentClassificationOutput,
     MemoryContext,
@@ -16,6 +27,56 @@ from core.models import (
 )
 
 
+_PLANNER_SYSTEM_PROMPT = (
+    "You are an engineering planner for a software engineering assistant "
+    "called CodePilot.\n\n"
+    "Your ONLY task is to create a conceptual plan for solving a programming "
+    "problem. You must NOT write any code, pseudocode, or use code-like "
+    "tokens (such as 'def', 'class', 'import', '{', '}', ';', or '=>').\n\n"
+    "Respond with a STRICT JSON object matching this schema:\n\n"
+    "{\n"
+    '  \"problem_restated\": string,\n'
+    '  \"assumptions\": [list of strings],\n'
+    '  \"approaches\": [\n'
+    "    {\n"
+    '      \"id\": string,\n'
+    '      \"name\": string,\n'
+    '      \"high_level_steps\": [list of strings],\n'
+    '      \"complexity_estimate\": {\"time\": string, \"space\": string},\n'
+    '      \"pros\": [list of strings],\n'
+    '      \"cons\": [list of strings],\n'
+    '      \"suitable_for\": [list of strings]\n'
+    "    },\n"
+    "    ... at least 2 approaches total ...\n"
+    "  ],\n"
+    '  \"selected_approach_id\": string,\n'
+    '  \"selected_approach_justification\": string\n'
+    "}\n\n"
+    "Important guardrails:\n"
+    "- Keep the content conceptual and descriptive only.\n"
+    "- Do NOT include any language-specific APIs, keywords, or code-like "
+    "syntax.\n"
+    "- Focus on algorithms, data structures, and design choices in natural "
+    "language.\n"
+    "- The selected_approach_justification must explicitly mention trade-offs.\n\n"
+    "Output ONLY the JSON object. Do not include explanations, comments, "
+    "or any text before or after the JSON."
+)
+
+
+# The schema is sent as guidance with strict=False: strict structured outputs
+# require every object to be closed, which the free-form complexity_estimate
+# mapping in PlanningOutput does not satisfy. Built once at import.
+_PLANNING_RESPONSE_FORMAT: Dict[str, Any] = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "PlanningOutput",
+        "schema": PlanningOutput.model_json_schema(),
+        "strict": False,
+    },
+}
+
+
 @dataclass
 class EngineeringPlannerConfig:
     """
@@ -25,11 +86,16 @@ class EngineeringPlannerConfig:
         model: Name of the chat completion model to use.
         max_retries: Number of attempts to obtain a valid, parseable response.
         temperature: Sampling temperature for the model.
+        async_concurrency: Maximum attempts aplan keeps in flight at once;
+            the first reply that validates wins. Every slot is filled up
+            front and each is a billed completion, so values above 1 trade
+            spend for latency.
     """
 
     model: str = "gpt-4.1-mini"
     max_retries: int = 2
     temperature: float = 0.2
+    async_concurrency: int = 1
 
 
 class EngineeringPlannerAgent:
@@ -48,8 +114,10 @@ class EngineeringPlannerAgent:
         self,
         client: OpenAI,
         config: Optional[EngineeringPlannerConfig] = None,
+        async_client: Optional[AsyncOpenAI] = None,
     ) -> None:
         self._client = client
+        self._async_client = async_client
         self._config = config or EngineeringPlannerConfig()
 
     def plan(
@@ -63,22 +131,27 @@ class EngineeringPlannerAgent:
 
         This method attempts multiple times to obtain a valid JSON object that
         conforms to PlanningOutput. If validation repeatedly fails, a safe
-        deterministic fallback plan is used.
+        deterministic fallback plan is used. Validated plans for low-temperature
+        requests are cached process-wide, keyed by the full request.
         """
         memory_hint = self._build_memory_hint(memory_context)
         intent_summary = self._summarize_intent(intent)
+        messages = self._build_messages(raw_problem_input, intent_summary, memory_hint)
+        cache_key = completion_cache_key(
+            self._config.model, self._config.temperature, messages
+        )
+        cached = get_cached_completion(cache_key)
+        if cached is not None:
+            return cached
 
         last_error: Optional[Exception] = None
         for attempt in range(self._config.max_retries + 1):
             try:
-                raw_json = self._invoke_llm(
-                    raw_problem_input=raw_problem_input,
-                    intent_summary=intent_summary,
-                    memory_hint=memory_hint,
-                )
-                planning_output = PlanningOutput.model_validate(raw_json)
+                raw_json = self._invoke_llm(messages)
+                planning_output = PlanningOutput.model_validate_json(raw_json)
+                cache_completion(cache_key, planning_output)
                 return planning_output
-            except (json.JSONDecodeError, ValidationError, KeyError, TypeError) as exc:
+            except (ValidationError, ValueError) as exc:
                 last_error = exc
                 # On retry we simply loop; the prompt remains strict about format.
                 continue
@@ -90,6 +163,107 @@ class EngineeringPlannerAgent:
             error=last_error,
         )
 
+    async def aplan(
+        self,
+        intent: IntentClassificationOutput,
+        raw_problem_input: str,
+        memory_context: Optional[MemoryContext],
+    ) -> PlanningOutput:
+        """
+        Async counterpart of plan() backed by the AsyncOpenAI client.
+
+        Attempts run one at a time by default. With config.async_concurrency
+        above 1, that many run concurrently and the first reply that
+        validates as PlanningOutput is returned; the remaining calls are
+        cancelled. The total number of attempts is still bounded by
+        max_retries + 1.
+        """
+        async_client = self._async_client
+        if async_client is None:
+            raise RuntimeError(
+                "EngineeringPlannerAgent.aplan requires an AsyncOpenAI client."
+            )
+
+        memory_hint = self._build_memory_hint(memory_context)
+        intent_summary = self._summarize_intent(intent)
+        messages = self._build_messages(raw_problem_input, intent_summary, memory_hint)
+        cache_key = completion_cache_key(
+            self._config.model, self._config.temperature, messages
+        )
+        cached = get_cached_completion(cache_key)
+        if cached is not None:
+            return cached
+
+        planning_output, last_error = await first_valid_result(
+            lambda: self._ainvoke_llm(async_client, messages),
+            PlanningOutput.model_validate_json,
+            attempts=self._config.max_retries + 1,
+            concurrency=self._config.async_concurrency,
+        )
+        if planning_output is not None:
+            cache_completion(cache_key, planning_output)
+            return planning_output
+        return self._heuristic_fallback(
+            raw_problem_input=raw_problem_input,
+            intent=intent,
+            error=last_error,
+        )
+
+    def plan_batch(
+        self,
+        jobs: Sequence[Tuple[IntentClassificationOutput, str, Optional[MemoryContext]]],
+        poll_interval_seconds: float = 30.0,
+    ) -> List[PlanningOutput]:
+        """
+        Plan many (intent, raw_problem_input, memory_context) jobs with a
+        single OpenAI Batch API submission.
+
+        Intended for offline sweeps where cost matters more than latency: the
+        call blocks until the batch completes. Cache hits never reach the
+        batch; every other job gets one attempt and falls back to the
+        deterministic plan if its reply is missing or invalid.
+        """
+        results: List[Optional[PlanningOutput]] = []
+        pending: List[Tuple[int, Optional[str], List[Dict[str, str]]]] = []
+        for index, (intent, raw_problem_input, memory_context) in enumerate(jobs):
+            messages = self._build_messages(
+                raw_problem_input,
+                self._summarize_intent(intent),
+                self._build_memory_hint(memory_context),
+            )
+            cache_key = completion_cache_key(
+                self._config.model, self._config.temperature, messages
+            )
+            cached = get_cached_completion(cache_key)
+            results.append(cached if cached is not None else None)
+            if cached is None:
+                pending.append((index, cache_key, messages))
+
+        raw_outputs = run_batch_job(
+            self._client,
+            [self._build_request(messages) for _, _, messages in pending],
+            poll_interval_seconds=poll_interval_seconds,
+        )
+
+        for (index, cache_key, _), raw_json in zip(pending, raw_outputs):
+            intent, raw_problem_input, _memory = jobs[index]
+            error: Optional[Exception] = None
+            if raw_json is not None:
+                try:
+                    planning_output = PlanningOutput.model_validate_json(raw_json)
+                    cache_completion(cache_key, planning_output)
+                    results[index] = planning_output
+                    continue
+                except (ValidationError, ValueError) as exc:
+                    error = exc
+            results[index] = self._heuristic_fallback(
+                raw_problem_input=raw_problem_input,
+                intent=intent,
+                error=error,
+            )
+
+        return [result for result in results if result is not None]
+
     def _build_memory_hint(self, memory_context: Optional[MemoryContext]) -> str:
         if memory_context is None:
             return "No detailed user memory is available."
@@ -115,52 +289,15 @@ class EngineeringPlannerAgent:
             f"constraints={intent.constraints.model_dump()}"
         )
 
-    def _invoke_llm(
+    def _build_messages(
         self,
         raw_problem_input: str,
         intent_summary: str,
         memory_hint: str,
-    ) -> dict[str, Any]:
+    ) -> List[Dict[str, str]]:
         """
-        Call the underlying LLM and return a parsed JSON object suitable for
-        PlanningOutput.model_validate.
+        Build the chat messages shared by the sync and async call paths.
         """
-        system_prompt = (
-            "You are an engineering planner for a software engineering assistant "
-            "called CodePilot.\n\n"
-            "Your ONLY task is to create a conceptual plan for solving a programming "
-            "problem. You must NOT write any code, pseudocode, or use code-like "
-            "tokens (such as 'def', 'class', 'import', '{', '}', ';', or '=>').\n\n"
-            "Respond with a STRICT JSON object matching this schema:\n\n"
-            "{\n"
-            '  \"problem_restated\": string,\n'
-            '  \"assumptions\": [list of strings],\n'
-            '  \"approaches\": [\n'
-            "    {\n"
-            '      \"id\": string,\n'
-            '      \"name\": string,\n'
-            '      \"high_level_steps\": [list of strings],\n'
-            '      \"complexity_estimate\": {\"time\": string, \"space\": string},\n'
-            '      \"pros\": [list of strings],\n'
-            '      \"cons\": [list of strings],\n'
-            '      \"suitable_for\": [list of strings]\n'
-            "    },\n"
-            "    ... at least 2 approaches total ...\n"
-            "  ],\n"
-            '  \"selected_approach_id\": string,\n'
-            '  \"selected_approach_justification\": string\n'
-            "}\n\n"
-            "Important guardrails:\n"
-            "- Keep the content conceptual and descriptive only.\n"
-            "- Do NOT include any language-specific APIs, keywords, or code-like "
-            "syntax.\n"
-            "- Focus on algorithms, data structures, and design choices in natural "
-            "language.\n"
-            "- The selected_approach_justification must explicitly mention trade-offs.\n\n"
-            "Output ONLY the JSON object. Do not include explanations, comments, "
-            "or any text before or after the JSON."
-        )
-
         user_prompt = (
             f"Intent summary: {intent_summary}\n"
             f"User memory: {memory_hint}\n\n"
@@ -168,21 +305,41 @@ class EngineeringPlannerAgent:
             f"{raw_problem_input}\n"
         )
 
-        response = self._client.chat.completions.create(
-            model=self._config.model,
-            temperature=self._config.temperature,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-        )
+        return [
+            {"role": "system", "content": _PLANNER_SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt},
+        ]
 
-        content = response.choices[0].message.content
-        if content is None:
-            raise ValueError("LLM returned empty content for engineering planning.")
+    def _build_request(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        return {
+            "model": self._config.model,
+            "temperature": self._config.temperature,
+            "response_format": _PLANNING_RESPONSE_FORMAT,
+            "messages": messages,
+        }
 
-        content = content.strip()
-        return json.loads(content)
+    @retry_with_exponential_backoff()
+    def _invoke_llm(self, messages: List[Dict[str, str]]) -> str:
+        """
+        Stream the completion and return the first JSON object in it, stopping
+        as soon as that object closes; parsing and validation happen in a
+        single pass via PlanningOutput.model_validate_json.
+        """
+        return stream_json_completion(self._client, **self._build_request(messages))
+
+    @retry_with_exponential_backoff()
+    async def _ainvoke_llm(
+        self,
+        async_client: AsyncOpenAI,
+        messages: List[Dict[str, str]],
+    ) -> str:
+        """
+        Async variant of _invoke_llm; transient API errors are retried with
+        backoff.
+        """
+        return await astream_json_completion(
+            async_client, **self._build_request(messages)
+        )
 
     def _heuristic_fallback(
         self,
@@ -270,15 +427,23 @@ class EngineeringPlannerAgent:
         )
 
 
+# Read once so factories called on hot paths skip the environment lookup.
+_PLANNER_MODEL: Final[str] = os.getenv(
+    "CODEPILOT_PLANNER_MODEL", EngineeringPlannerConfig.model
+)
+
+
 def create_default_engineering_planner() -> EngineeringPlannerAgent:
     """
     Convenience factory that builds an EngineeringPlannerAgent using
     environment variables for configuration.
 
     Environment variables:
-      - CODEPILOT_PLANNER_MODEL: override default model name.
+      - CODEPILOT_PLANNER_MODEL: override default model name (read once at import).
     """
-    model = os.getenv("CODEPILOT_PLANNER_MODEL", EngineeringPlannerConfig.model)
-    config = EngineeringPlannerConfig(model=model)
-    client = OpenAI()
-    return EngineeringPlannerAgent(client=client, config=config)
+    config = EngineeringPlannerConfig(model=_PLANNER_MODEL)
+    return EngineeringPlannerAgent(
+        client=get_openai_client(),
+        config=config,
+        async_client=get_async_openai_client(),
+    )
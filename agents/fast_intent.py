@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import os
+import pickle
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+from core.models import ProblemType
+
+
+class FastIntentClassifier:
+    """
+    Local problem-type classifier used to skip the LLM for easy problems.
+
+    Wraps a scikit-learn pipeline trained offline on labelled problem logs,
+    typically TfidfVectorizer(ngram_range=(1, 2)) followed by
+    LogisticRegression, whose classes are ProblemType values. Prediction
+    takes well under a millisecond, so it is cheap to try before every
+    classification.
+
+    The pipeline is unpickled, so only load files from a trusted location.
+    """
+
+    def __init__(self, pipeline: Any) -> None:
+        self._pipeline = pipeline
+        self._classes = [ProblemType(label) for label in pipeline.classes_]
+
+    @classmethod
+    def load(cls, path: str | Path) -> "FastIntentClassifier":
+        with open(path, "rb") as handle:
+            return cls(pickle.load(handle))
+
+    @classmethod
+    def from_env(cls) -> Optional["FastIntentClassifier"]:
+        """
+        Load the pipeline named by CODEPILOT_FAST_INTENT_MODEL, or return None
+        when the variable is unset.
+        """
+        path = os.getenv("CODEPILOT_FAST_INTENT_MODEL")
+        if not path:
+            return None
+        return cls.load(path)
+
+    def predict(self, raw_problem_input: str) -> Tuple[ProblemType, float]:
+        """
+        Return the most likely problem type and its predicted probability.
+        """
+        probabilities = self._pipeline.predict_proba([raw_problem_input])[0]
+        best = max(range(len(probabilities)), key=probabilities.__getitem__)
+        return self._classes[best], float(probabilities[best])
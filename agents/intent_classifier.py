@@ -1,13 +1,30 @@
 from __future__ import annotations
 
-import json
+import asyncio
+import atexit
+import contextlib
+import functools
+import hashlib
 import os
+import re
 from dataclasses import dataclass
-from typing import Any, Optional
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
-from groq import Groq
-from pydantic import ValidationError
+import groq
+from groq import AsyncGroq, Groq
+from pydantic import TypeAdapter, ValidationError
+from pydantic_core import from_json
 
+from agents.fast_intent import FastIntentClassifier
+from agents.llm_utils import (
+    astream_tool_arguments,
+    get_async_http_client,
+    get_http_client,
+    retry_with_exponential_backoff,
+    stream_tool_arguments,
+)
+from agents.semantic_cache import SemanticCacheConfig, SemanticIntentCache
+from core.cache import LRUCache, SingleFlight
 from core.models import (
     IntentClassificationOutput,
     IntentConstraints,
@@ -19,15 +36,144 @@ from core.models import (
 )
 
 
+# Transient Groq API errors worth retrying with backoff.
+_GROQ_TRANSIENT_ERRORS = (
+    groq.RateLimitError,
+    groq.APITimeoutError,
+    groq.APIConnectionError,
+)
+
+
+# Kept as a module constant so every call and retry sends a byte-identical
+# prefix, which lets the provider's automatic prompt caching reuse it.
+_INTENT_SYSTEM_PROMPT = (
+    "Classify a software engineering request for the CodePilot assistant "
+    "by calling classify_intent. Languages are lowercase; confidence is "
+    "between 0 and 1."
+)
+
+
+def _classify_intent_parameters() -> Dict[str, Any]:
+    schema = IntentClassificationOutput.model_json_schema()
+    # raw_json is filled in locally from the reply, never by the model.
+    schema["properties"].pop("raw_json", None)
+    return schema
+
+
+# The reply's schema travels as the parameters of a single forced tool call,
+# so the provider returns structured arguments instead of free-form text that
+# may be wrapped in prose or code fences. Built once at import.
+_CLASSIFY_INTENT_TOOL_NAME = "classify_intent"
+_CLASSIFY_INTENT_TOOLS: List[Dict[str, Any]] = [
+    {
+        "type": "function",
+        "function": {
+            "name": _CLASSIFY_INTENT_TOOL_NAME,
+            "description": "Record the classified intent of the user's request.",
+            "parameters": _classify_intent_parameters(),
+        },
+    }
+]
+_CLASSIFY_INTENT_TOOL_CHOICE: Dict[str, Any] = {
+    "type": "function",
+    "function": {"name": _CLASSIFY_INTENT_TOOL_NAME},
+}
+
+
+_INTENT_ADAPTER: TypeAdapter[IntentClassificationOutput] = TypeAdapter(
+    IntentClassificationOutput
+)
+
+# Heuristic fallback keywords in priority order: when several keywords for the
+# same field occur in the problem, the one listed first wins.
+_PROBLEM_TYPE_KEYWORDS: Tuple[Tuple[str, ProblemType], ...] = (
+    ("optimize", ProblemType.OPTIMIZATION),
+    ("bug", ProblemType.BUG_FIX),
+    ("fix", ProblemType.BUG_FIX),
+    ("system", ProblemType.SYSTEM),
+    ("api", ProblemType.SYSTEM),
+)
+_CONTEXT_KEYWORDS: Tuple[Tuple[str, ProblemContext], ...] = (
+    ("interview", ProblemContext.INTERVIEW),
+    ("production", ProblemContext.PRODUCTION),
+)
+_PROBLEM_TYPE_RANKS = {kw: rank for rank, (kw, _) in enumerate(_PROBLEM_TYPE_KEYWORDS)}
+_CONTEXT_RANKS = {kw: rank for rank, (kw, _) in enumerate(_CONTEXT_KEYWORDS)}
+# The zero-width lookahead reports overlapping keywords too, so one pass over
+# the text finds every keyword the substring checks would have found.
+# IGNORECASE spares a lowercased copy of the whole problem text.
+_FALLBACK_KEYWORD_RE = re.compile(
+    "(?=(%s))" % "|".join(
+        re.escape(kw) for kw in (*_PROBLEM_TYPE_RANKS, *_CONTEXT_RANKS)
+    ),
+    re.IGNORECASE,
+)
+
+
+def _scan_fallback_keywords(text: str) -> Tuple[ProblemType, ProblemContext]:
+    """
+    Pick the heuristic problem type and context from the highest-priority
+    keywords in text, in a single regex pass.
+    """
+    type_rank = len(_PROBLEM_TYPE_KEYWORDS)
+    context_rank = len(_CONTEXT_KEYWORDS)
+    for match in _FALLBACK_KEYWORD_RE.finditer(text):
+        keyword = match.group(1).lower()
+        if keyword in _PROBLEM_TYPE_RANKS:
+            type_rank = min(type_rank, _PROBLEM_TYPE_RANKS[keyword])
+        else:
+            context_rank = min(context_rank, _CONTEXT_RANKS[keyword])
+        if type_rank == 0 and context_rank == 0:
+            break
+
+    problem_type = (
+        _PROBLEM_TYPE_KEYWORDS[type_rank][1]
+        if type_rank < len(_PROBLEM_TYPE_KEYWORDS)
+        else ProblemType.DSA
+    )
+    context = (
+        _CONTEXT_KEYWORDS[context_rank][1]
+        if context_rank < len(_CONTEXT_KEYWORDS)
+        else ProblemContext.UNKNOWN
+    )
+    return problem_type, context
+
+
+@functools.lru_cache(maxsize=1024)
+def _memory_hint(language: str, style: str) -> str:
+    return (
+        f"User preferred language: {language}. "
+        f"User preferred style_mode: {style}."
+    )
+
+
 @dataclass
 class IntentClassifierConfig:
     """
     Configuration for the LLM-backed IntentClassifierAgent.
+
+    Attributes:
+        model: Groq model name used for classification.
+        max_retries: Number of additional attempts after the first failure.
+        temperature: Sampling temperature for the LLM.
+        result_cache_size: Maximum number of classifications kept in the
+            per-agent cache, keyed by problem text, memory hint and model.
+        fallback_cache_ttl_seconds: Lifetime of cached heuristic fallback
+            results, kept short so a transient LLM failure is retried soon.
+        max_concurrency: Maximum number of requests classify_many keeps in
+            flight at once.
+        fast_path_threshold: Minimum probability the local
+            FastIntentClassifier must assign to a problem type for the LLM
+            call to be skipped.
     """
 
     model: str = "llama3-8b-8192"
     max_retries: int = 2
     temperature: float = 0.0
+    result_cache_size: int = 512
+    fallback_cache_ttl_seconds: float = 60.0
+    max_concurrency: int = 8
+    fast_path_threshold: float = 0.85
 
 
 class IntentClassifierAgent:
@@ -39,9 +185,19 @@ class IntentClassifierAgent:
         self,
         client: Groq,
         config: Optional[IntentClassifierConfig] = None,
+        semantic_cache: Optional[SemanticIntentCache] = None,
+        async_client: Optional[AsyncGroq] = None,
+        fast_classifier: Optional[FastIntentClassifier] = None,
     ) -> None:
         self._client = client
+        self._async_client = async_client
+        self._fast_classifier = fast_classifier
         self._config = config or IntentClassifierConfig()
+        self._semantic_cache = semantic_cache
+        self._result_cache: LRUCache[IntentClassificationOutput] = LRUCache(
+            maxsize=self._config.result_cache_size,
+        )
+        self._inflight: SingleFlight[IntentClassificationOutput] = SingleFlight()
 
     def classify(
         self,
@@ -49,19 +205,237 @@ class IntentClassifierAgent:
         memory_context: Optional[MemoryContext],
     ) -> IntentClassificationOutput:
         context_hint = self._build_memory_hint(memory_context)
+        cache_key = self._result_cache_key(raw_problem_input, context_hint)
+        cached = self._lookup_cached(raw_problem_input, context_hint, cache_key)
+        if cached is not None:
+            return cached
+
+        fast = self._fast_path(raw_problem_input, memory_context, cache_key)
+        if fast is not None:
+            return fast
+
+        # Concurrent calls for the same problem and hint share one LLM call.
+        return self._inflight.run(
+            cache_key,
+            lambda: self._result_cache.get(cache_key)
+            or self._classify_with_llm(
+                raw_problem_input, memory_context, context_hint, cache_key
+            ),
+        )
+
+    def _classify_with_llm(
+        self,
+        raw_problem_input: str,
+        memory_context: Optional[MemoryContext],
+        context_hint: str,
+        cache_key: str,
+    ) -> IntentClassificationOutput:
+        messages = self._build_messages(raw_problem_input, context_hint)
+        last_error: Optional[Exception] = None
+        for _ in range(self._config.max_retries + 1):
+            try:
+                content = self._invoke_llm(messages)
+                return self._accept_reply(
+                    raw_problem_input, context_hint, cache_key, content
+                )
+            except (ValidationError, ValueError) as exc:
+                last_error = exc
+                continue
+
+        return self._fallback(raw_problem_input, memory_context, cache_key, last_error)
+
+    async def aclassify(
+        self,
+        raw_problem_input: str,
+        memory_context: Optional[MemoryContext],
+    ) -> IntentClassificationOutput:
+        """
+        Async counterpart of classify backed by the AsyncGroq client.
+        """
+        return await self._aclassify(raw_problem_input, memory_context, None)
+
+    def classify_many(
+        self,
+        problems: Sequence[Tuple[str, Optional[MemoryContext]]],
+    ) -> List[IntentClassificationOutput]:
+        """
+        Classify many problems concurrently; results are returned in input
+        order. Synchronous wrapper around aclassify_many for callers that are
+        not already running an event loop.
+        """
+        return asyncio.run(self.aclassify_many(problems))
+
+    async def aclassify_many(
+        self,
+        problems: Sequence[Tuple[str, Optional[MemoryContext]]],
+    ) -> List[IntentClassificationOutput]:
+        """
+        Async counterpart of classify_many backed by the AsyncGroq client.
+
+        At most config.max_concurrency requests are in flight at once, so
+        N problems take roughly N / max_concurrency round trips instead of N.
+        """
+        semaphore = asyncio.Semaphore(self._config.max_concurrency)
+        return list(
+            await asyncio.gather(
+                *(
+                    self._aclassify(problem, context, semaphore)
+                    for problem, context in problems
+                )
+            )
+        )
+
+    async def _aclassify(
+        self,
+        raw_problem_input: str,
+        memory_context: Optional[MemoryContext],
+        semaphore: Optional[asyncio.Semaphore],
+    ) -> IntentClassificationOutput:
+        async_client = self._async_client
+        if async_client is None:
+            raise RuntimeError(
+                "IntentClassifierAgent async classification requires an AsyncGroq client."
+            )
+
+        context_hint = self._build_memory_hint(memory_context)
+        cache_key = self._result_cache_key(raw_problem_input, context_hint)
+        cached = self._lookup_cached(raw_problem_input, context_hint, cache_key)
+        if cached is not None:
+            return cached
 
+        fast = self._fast_path(raw_problem_input, memory_context, cache_key)
+        if fast is not None:
+            return fast
+
+        async def classify_with_llm() -> IntentClassificationOutput:
+            cached = self._result_cache.get(cache_key)
+            if cached is not None:
+                return cached
+            return await self._aclassify_with_llm(
+                raw_problem_input,
+                memory_context,
+                context_hint,
+                cache_key,
+                async_client,
+                semaphore,
+            )
+
+        return await self._inflight.arun(cache_key, classify_with_llm)
+
+    async def _aclassify_with_llm(
+        self,
+        raw_problem_input: str,
+        memory_context: Optional[MemoryContext],
+        context_hint: str,
+        cache_key: str,
+        async_client: AsyncGroq,
+        semaphore: Optional[asyncio.Semaphore],
+    ) -> IntentClassificationOutput:
+        messages = self._build_messages(raw_problem_input, context_hint)
         last_error: Optional[Exception] = None
         for _ in range(self._config.max_retries + 1):
             try:
-                raw_json = self._invoke_llm(raw_problem_input, context_hint)
-                parsed = IntentClassificationOutput.model_validate(raw_json)
-                parsed.raw_json = raw_json
-                return parsed
-            except (json.JSONDecodeError, ValidationError, KeyError, TypeError) as exc:
+                async with semaphore or contextlib.nullcontext():
+                    content = await self._ainvoke_llm(async_client, messages)
+                return self._accept_reply(
+                    raw_problem_input, context_hint, cache_key, content
+                )
+            except (ValidationError, ValueError) as exc:
                 last_error = exc
                 continue
 
-        return self._heuristic_fallback(raw_problem_input, memory_context, last_error)
+        return self._fallback(raw_problem_input, memory_context, cache_key, last_error)
+
+    def _lookup_cached(
+        self,
+        raw_problem_input: str,
+        context_hint: str,
+        cache_key: str,
+    ) -> Optional[IntentClassificationOutput]:
+        cached = self._result_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        # Paraphrases of an already classified problem reuse its result.
+        semantic_cache = self._semantic_cache
+        if semantic_cache is not None and semantic_cache.enabled:
+            similar = semantic_cache.lookup(raw_problem_input, context_hint)
+            if similar is not None:
+                self._result_cache.put(cache_key, similar)
+                return similar
+        return None
+
+    def _fast_path(
+        self,
+        raw_problem_input: str,
+        memory_context: Optional[MemoryContext],
+        cache_key: str,
+    ) -> Optional[IntentClassificationOutput]:
+        """
+        Classify locally when the fast classifier is confident enough; the
+        context still comes from the keyword scan.
+        """
+        if self._fast_classifier is None:
+            return None
+
+        problem_type, confidence = self._fast_classifier.predict(raw_problem_input)
+        if confidence < self._config.fast_path_threshold:
+            return None
+
+        _, context = _scan_fallback_keywords(raw_problem_input)
+        result = self._build_local_output(
+            problem_type,
+            context,
+            memory_context,
+            confidence=confidence,
+            raw_json={"fast_path": True},
+        )
+        self._result_cache.put(cache_key, result)
+        return result
+
+    def _accept_reply(
+        self,
+        raw_problem_input: str,
+        context_hint: str,
+        cache_key: str,
+        content: str,
+    ) -> IntentClassificationOutput:
+        # Decoded once: the dict is validated and also kept as raw_json for
+        # API consumers.
+        raw_json = from_json(content)
+        parsed = _INTENT_ADAPTER.validate_python(raw_json).model_copy(
+            update={"raw_json": raw_json}
+        )
+        self._result_cache.put(cache_key, parsed)
+        semantic_cache = self._semantic_cache
+        if semantic_cache is not None and semantic_cache.enabled:
+            semantic_cache.store(raw_problem_input, context_hint, parsed)
+        return parsed
+
+    def _fallback(
+        self,
+        raw_problem_input: str,
+        memory_context: Optional[MemoryContext],
+        cache_key: str,
+        error: Optional[Exception],
+    ) -> IntentClassificationOutput:
+        fallback = self._heuristic_fallback(raw_problem_input, memory_context, error)
+        self._result_cache.put(
+            cache_key, fallback, ttl_seconds=self._config.fallback_cache_ttl_seconds
+        )
+        return fallback
+
+    def _result_cache_key(self, raw_problem_input: str, context_hint: str) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        for part in (
+            raw_problem_input,
+            context_hint,
+            self._config.model,
+            repr(self._config.temperature),
+        ):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
 
     def _build_memory_hint(self, memory_context: Optional[MemoryContext]) -> str:
         if memory_context is None:
@@ -73,56 +447,45 @@ class IntentClassifierAgent:
             if memory_context.preferred_style_mode
             else "unknown"
         )
-        return (
-            f"User preferred language: {language}. "
-            f"User preferred style_mode: {style}."
-        )
-
-    def _invoke_llm(self, problem_input: str, memory_hint: str) -> dict[str, Any]:
-        system_prompt = (
-            "You are an intent classification engine for a software engineering "
-            "assistant called CodePilot.\n\n"
-            "Output ONLY a strict JSON object matching this schema:\n\n"
-            "{\n"
-            '  "problem_type": one of ["dsa", "system", "bug_fix", "optimization", "other"],\n'
-            '  "context": one of ["interview", "production", "learning", "experimental", "unknown"],\n'
-            '  "languages": [list of lowercase language strings],\n'
-            '  "constraints": {\n'
-            '    "time_complexity_target": string or null,\n'
-            '    "space_complexity_target": string or null,\n'
-            '    "memory_limit_mb": integer or null,\n'
-            '    "time_budget_ms": integer or null,\n'
-            '    "additional_constraints": [list of strings]\n'
-            "  },\n"
-            '  "style_preferences": {\n'
-            '    "language": string or null,\n'
-            '    "style_mode": one of ["readable", "competitive", "enterprise", null]\n'
-            "  },\n"
-            '  "confidence": number between 0 and 1\n'
-            "}\n\n"
-            "Return ONLY valid JSON."
-        )
+        return _memory_hint(language, style)
 
+    def _build_messages(self, problem_input: str, memory_hint: str) -> List[Dict[str, str]]:
         user_prompt = (
             f"{memory_hint}\n\n"
             "User problem description:\n"
             f"{problem_input}"
         )
+        return [
+            {"role": "system", "content": _INTENT_SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt},
+        ]
 
-        response = self._client.chat.completions.create(
-            model=self._config.model,
-            temperature=self._config.temperature,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-        )
+    def _build_request(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        return {
+            "model": self._config.model,
+            "temperature": self._config.temperature,
+            "tools": _CLASSIFY_INTENT_TOOLS,
+            "tool_choice": _CLASSIFY_INTENT_TOOL_CHOICE,
+            "messages": messages,
+        }
 
-        content = response.choices[0].message.content
-        if not content:
-            raise ValueError("LLM returned empty content.")
+    @retry_with_exponential_backoff(retry_on=_GROQ_TRANSIENT_ERRORS)
+    def _invoke_llm(self, messages: List[Dict[str, str]]) -> str:
+        """
+        Stream the classify_intent call and return its arguments as soon as
+        the JSON object closes.
+        """
+        return stream_tool_arguments(self._client, **self._build_request(messages))
 
-        return json.loads(content.strip())
+    @retry_with_exponential_backoff(retry_on=_GROQ_TRANSIENT_ERRORS)
+    async def _ainvoke_llm(
+        self,
+        async_client: AsyncGroq,
+        messages: List[Dict[str, str]],
+    ) -> str:
+        return await astream_tool_arguments(
+            async_client, **self._build_request(messages)
+        )
 
     def _heuristic_fallback(
         self,
@@ -130,25 +493,23 @@ class IntentClassifierAgent:
         memory_context: Optional[MemoryContext],
         error: Optional[Exception],
     ) -> IntentClassificationOutput:
-        text = raw_problem_input.lower()
-
-        if "optimize" in text:
-            problem_type = ProblemType.OPTIMIZATION
-        elif "bug" in text or "fix" in text:
-            problem_type = ProblemType.BUG_FIX
-        elif "system" in text or "api" in text:
-            problem_type = ProblemType.SYSTEM
-        else:
-            problem_type = ProblemType.DSA
-
-        context = (
-            ProblemContext.INTERVIEW
-            if "interview" in text
-            else ProblemContext.PRODUCTION
-            if "production" in text
-            else ProblemContext.UNKNOWN
+        problem_type, context = _scan_fallback_keywords(raw_problem_input)
+        return self._build_local_output(
+            problem_type,
+            context,
+            memory_context,
+            confidence=0.4,
+            raw_json={"fallback": True, "error": str(error)},
         )
 
+    def _build_local_output(
+        self,
+        problem_type: ProblemType,
+        context: ProblemContext,
+        memory_context: Optional[MemoryContext],
+        confidence: float,
+        raw_json: Dict[str, Any],
+    ) -> IntentClassificationOutput:
         preferred_style = (
             memory_context.preferred_style_mode
             if memory_context and memory_context.preferred_style_mode
@@ -161,17 +522,19 @@ class IntentClassifierAgent:
             else "python"
         )
 
-        return IntentClassificationOutput(
+        # Every value here is an enum member, a literal or already validated,
+        # so validation is skipped.
+        return IntentClassificationOutput.model_construct(
             problem_type=problem_type,
             context=context,
             languages=[preferred_language],
-            constraints=IntentConstraints(),
-            style_preferences=StylePreferences(
+            constraints=IntentConstraints.model_construct(),
+            style_preferences=StylePreferences.model_construct(
                 language=preferred_language,
                 style_mode=preferred_style,
             ),
-            confidence=0.4,
-            raw_json={"fallback": True, "error": str(error)},
+            confidence=confidence,
+            raw_json=raw_json,
         )
 
 
@@ -179,5 +542,23 @@ def create_default_intent_classifier() -> IntentClassifierAgent:
     model = os.getenv("CODEPILOT_INTENT_MODEL", "llama3-8b-8192")
     config = IntentClassifierConfig(model=model)
 
-    client = Groq(api_key=os.environ["GROQ_API_KEY"])
-    return IntentClassifierAgent(client=client, config=config)
+    # Groq clients share the process-wide connection pool with the OpenAI
+    # agents; retries are handled by _invoke_llm's backoff.
+    api_key = os.environ["GROQ_API_KEY"]
+    client = Groq(api_key=api_key, http_client=get_http_client(), max_retries=0)
+
+    semantic_cache: Optional[SemanticIntentCache] = None
+    semantic_config = SemanticCacheConfig.from_env()
+    if semantic_config.enabled:
+        semantic_cache = SemanticIntentCache(semantic_config)
+        atexit.register(semantic_cache.save)
+
+    return IntentClassifierAgent(
+        client=client,
+        config=config,
+        semantic_cache=semantic_cache,
+        async_client=AsyncGroq(
+            api_key=api_key, http_client=get_async_http_client(), max_retries=0
+        ),
+        fast_classifier=FastIntentClassifier.from_env(),
+    )
@@ -0,0 +1,605 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import hashlib
+import importlib.util
+import inspect
+import io
+import json
+import os
+import random
+import threading
+import time
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    TypeVar,
+)
+
+import httpx
+import openai
+
+from core.cache import LRUCache
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional speedup
+    orjson = None  # type: ignore[assignment]
+
+F = TypeVar("F", bound=Callable[..., Any])
+T = TypeVar("T")
+
+# Errors worth retrying after a pause: the request never produced a usable
+# response, and the server (or network) is likely to recover on its own.
+OPENAI_TRANSIENT_ERRORS: Tuple[Type[BaseException], ...] = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+)
+
+
+# Validated replies to low-temperature requests, shared by every agent in the
+# process and keyed by a digest of the full request (model, temperature and
+# messages). Above COMPLETION_CACHE_MAX_TEMPERATURE replies are meant to vary,
+# so they are never cached.
+COMPLETION_CACHE_MAX_TEMPERATURE = 0.2
+_COMPLETION_CACHE: LRUCache[Any] = LRUCache(maxsize=512)
+
+
+# HTTP/2 multiplexes concurrent requests over one connection, but httpx only
+# supports it when the optional h2 package is installed.
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+_HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+
+_CLIENT_LOCK = threading.Lock()
+_SHARED_HTTP_CLIENT: Optional[httpx.Client] = None
+_SHARED_ASYNC_HTTP_CLIENT: Optional[httpx.AsyncClient] = None
+_SHARED_CLIENT: Optional[openai.OpenAI] = None
+_SHARED_ASYNC_CLIENT: Optional[openai.AsyncOpenAI] = None
+
+
+def get_http_client() -> httpx.Client:
+    """
+    Return the process-wide httpx client, creating it on first use.
+
+    Every SDK client (OpenAI and Groq) is built on this one connection pool,
+    so TLS/TCP handshakes are paid once per host per process instead of once
+    per agent.
+    """
+    global _SHARED_HTTP_CLIENT
+    with _CLIENT_LOCK:
+        if _SHARED_HTTP_CLIENT is None:
+            _SHARED_HTTP_CLIENT = httpx.Client(
+                http2=_HTTP2_AVAILABLE, limits=_HTTP_LIMITS
+            )
+        return _SHARED_HTTP_CLIENT
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    Async counterpart of get_http_client.
+    """
+    global _SHARED_ASYNC_HTTP_CLIENT
+    with _CLIENT_LOCK:
+        if _SHARED_ASYNC_HTTP_CLIENT is None:
+            _SHARED_ASYNC_HTTP_CLIENT = httpx.AsyncClient(
+                http2=_HTTP2_AVAILABLE, limits=_HTTP_LIMITS
+            )
+        return _SHARED_ASYNC_HTTP_CLIENT
+
+
+def get_openai_client() -> openai.OpenAI:
+    """
+    Return the process-wide OpenAI client, creating it on first use.
+
+    The client sits on the shared httpx pool from get_http_client. SDK-level
+    retries are disabled because agents back off on their own; use
+    client.with_options(timeout=...) for per-agent timeouts, which keeps the
+    shared pool.
+    """
+    http_client = get_http_client()
+    global _SHARED_CLIENT
+    with _CLIENT_LOCK:
+        if _SHARED_CLIENT is None:
+            _SHARED_CLIENT = openai.OpenAI(http_client=http_client, max_retries=0)
+        return _SHARED_CLIENT
+
+
+def get_async_openai_client() -> openai.AsyncOpenAI:
+    """
+    Async counterpart of get_openai_client.
+    """
+    http_client = get_async_http_client()
+    global _SHARED_ASYNC_CLIENT
+    with _CLIENT_LOCK:
+        if _SHARED_ASYNC_CLIENT is None:
+            _SHARED_ASYNC_CLIENT = openai.AsyncOpenAI(
+                http_client=http_client, max_retries=0
+            )
+        return _SHARED_ASYNC_CLIENT
+
+
+async def aclose_http_clients() -> None:
+    """
+    Close the shared connection pools, e.g. on application shutdown.
+
+    SDK clients already built on them become unusable (later getter calls
+    build fresh ones); call this only once nothing will issue further
+    requests.
+    """
+    global _SHARED_HTTP_CLIENT, _SHARED_ASYNC_HTTP_CLIENT
+    global _SHARED_CLIENT, _SHARED_ASYNC_CLIENT
+    with _CLIENT_LOCK:
+        http_client, _SHARED_HTTP_CLIENT = _SHARED_HTTP_CLIENT, None
+        async_http_client, _SHARED_ASYNC_HTTP_CLIENT = _SHARED_ASYNC_HTTP_CLIENT, None
+        _SHARED_CLIENT = _SHARED_ASYNC_CLIENT = None
+    if http_client is not None:
+        http_client.close()
+    if async_http_client is not None:
+        await async_http_client.aclose()
+
+
+def completion_cache_key(
+    model: str,
+    temperature: float,
+    messages: List[Dict[str, str]],
+) -> Optional[str]:
+    """
+    Return the cache key for a chat request, or None if it is not cacheable.
+    """
+    if temperature > COMPLETION_CACHE_MAX_TEMPERATURE:
+        return None
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(dumps_json([model, temperature, messages]).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def get_cached_completion(key: Optional[str]) -> Any:
+    return _COMPLETION_CACHE.get(key) if key is not None else None
+
+
+def cache_completion(key: Optional[str], value: Any) -> None:
+    if key is not None:
+        _COMPLETION_CACHE.put(key, value)
+
+
+class RateLimiter:
+    """
+    Proactive client-side throttle for requests-per-minute and
+    tokens-per-minute budgets.
+
+    Each budget is a token bucket that starts full and refills continuously
+    at limit / 60 per second. acquire() blocks until both buckets can cover
+    the request, so calls wait locally instead of being rejected with a 429
+    and retried. A limit of None disables that bucket.
+    """
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None) -> None:
+        self._limits = (rpm, tpm)
+        self._levels = [rpm or 0.0, tpm or 0.0]
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        """
+        Build a limiter from CODEPILOT_RPM / CODEPILOT_TPM; unset variables
+        leave the corresponding budget unlimited.
+        """
+        rpm = os.getenv("CODEPILOT_RPM")
+        tpm = os.getenv("CODEPILOT_TPM")
+        return cls(
+            rpm=float(rpm) if rpm else None,
+            tpm=float(tpm) if tpm else None,
+        )
+
+    def _reserve(self, tokens: int) -> float:
+        """
+        Take capacity for one request if available; otherwise return how many
+        seconds to wait before trying again.
+        """
+        costs = (1.0, float(tokens))
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated_at
+            self._updated_at = now
+            wait = 0.0
+            for i, limit in enumerate(self._limits):
+                if not limit:
+                    continue
+                self._levels[i] = min(limit, self._levels[i] + elapsed * limit / 60.0)
+                # A request larger than the whole budget waits for a full bucket.
+                needed = min(costs[i], limit)
+                if self._levels[i] < needed:
+                    wait = max(wait, (needed - self._levels[i]) * 60.0 / limit)
+            if wait > 0:
+                return wait
+            for i, limit in enumerate(self._limits):
+                if limit:
+                    self._levels[i] -= costs[i]
+            return 0.0
+
+    def acquire(self, tokens: int) -> None:
+        while True:
+            wait = self._reserve(tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: int) -> None:
+        while True:
+            wait = self._reserve(tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+
+# One limiter per process, so every agent draws from the same account budget.
+_RATE_LIMITER = RateLimiter.from_env()
+
+
+def get_rate_limiter() -> RateLimiter:
+    return _RATE_LIMITER
+
+
+def estimate_request_tokens(
+    messages: Sequence[Dict[str, str]],
+    max_tokens: Optional[int] = None,
+) -> int:
+    """
+    Rough token estimate for TPM accounting: about four characters per prompt
+    token plus the completion budget, which providers count against TPM.
+    """
+    prompt_chars = sum(len(message.get("content") or "") for message in messages)
+    return prompt_chars // 4 + (max_tokens or 0)
+
+
+def dumps_json(payload: Any, sort_keys: bool = False) -> str:
+    """
+    Serialize a prompt payload to a JSON string.
+
+    Uses orjson when it is installed and falls back to the stdlib otherwise.
+    Both paths emit non-ASCII characters verbatim. With sort_keys, equal
+    payloads always serialize to byte-identical text, which keeps prompts
+    eligible for server-side prompt caching.
+    """
+    if orjson is not None:
+        option = orjson.OPT_SORT_KEYS if sort_keys else 0
+        return orjson.dumps(payload, option=option).decode("utf-8")
+    return json.dumps(payload, ensure_ascii=False, sort_keys=sort_keys)
+
+
+def retry_with_exponential_backoff(
+    max_attempts: int = 4,
+    base: float = 2.0,
+    cap: float = 30.0,
+    retry_on: Tuple[Type[BaseException], ...] = OPENAI_TRANSIENT_ERRORS,
+) -> Callable[[F], F]:
+    """
+    Retry the decorated call on transient API errors, sleeping
+    min(cap, base ** attempt) plus up to one second of jitter between attempts.
+
+    Only errors in retry_on are retried; anything else (including schema or
+    validation failures, which backoff does not help with) propagates
+    immediately. The last transient error is re-raised once max_attempts is
+    exhausted. Coroutine functions are supported and back off with
+    asyncio.sleep.
+    """
+
+    def decorator(func: F) -> F:
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                for attempt in range(max_attempts):
+                    try:
+                        return await func(*args, **kwargs)
+                    except retry_on:
+                        if attempt == max_attempts - 1:
+                            raise
+                        await asyncio.sleep(min(cap, base ** attempt) + random.uniform(0, 1))
+
+            return async_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            for attempt in range(max_attempts):
+                try:
+                    return func(*args, **kwargs)
+                except retry_on:
+                    if attempt == max_attempts - 1:
+                        raise
+                    time.sleep(min(cap, base ** attempt) + random.uniform(0, 1))
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+async def first_valid_result(
+    attempt: Callable[[], Awaitable[str]],
+    parse: Callable[[str], T],
+    attempts: int,
+    concurrency: int,
+    hedge_delay: Optional[float] = None,
+) -> Tuple[Optional[T], Optional[Exception]]:
+    """
+    Run up to `attempts` LLM calls, at most `concurrency` at a time, and
+    return the first reply that parse() accepts.
+
+    A reply rejected by parse() (any ValueError, which includes pydantic's
+    ValidationError) frees its slot for the next attempt; calls still in
+    flight once a reply is accepted are cancelled. Returns None and the last
+    rejection if no reply is accepted.
+
+    Without hedge_delay every free slot is filled at once. With it, attempts
+    start one at a time: the next one only after a rejection, or alongside
+    calls that are still running after hedge_delay seconds.
+    """
+    last_error: Optional[Exception] = None
+    launched = 0
+    pending: Set["asyncio.Future[str]"] = set()
+    try:
+        while launched < attempts or pending:
+            while launched < attempts and len(pending) < concurrency:
+                pending.add(asyncio.ensure_future(attempt()))
+                launched += 1
+                if hedge_delay is not None:
+                    break
+            done, pending = await asyncio.wait(
+                pending, timeout=hedge_delay, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                try:
+                    return parse(task.result()), None
+                except ValueError as exc:
+                    last_error = exc
+    finally:
+        for task in pending:
+            task.cancel()
+    return None, last_error
+
+
+class _JsonObjectScanner:
+    """
+    Incrementally tracks brace depth to find where the first top-level JSON
+    object ends, ignoring braces inside string literals. Text before the
+    first '{' (such as a stray code fence) is skipped.
+    """
+
+    def __init__(self) -> None:
+        self.start: Optional[int] = None
+        self._offset = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text: str) -> Optional[int]:
+        """
+        Consume the next chunk; return the absolute end offset (exclusive) of
+        the top-level object once it closes, else None.
+        """
+        for i, ch in enumerate(text):
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                if self.start is not None:
+                    self._in_string = True
+            elif ch == "{":
+                if self.start is None:
+                    self.start = self._offset + i
+                self._depth += 1
+            elif ch == "}" and self.start is not None:
+                self._depth -= 1
+                if self._depth == 0:
+                    return self._offset + i + 1
+        self._offset += len(text)
+        return None
+
+
+def extract_json_object(text: str) -> str:
+    """
+    Return the first top-level JSON object in text, dropping anything around
+    it such as markdown code fences or trailing commentary, in one linear
+    scan. If no complete object is found the stripped text is returned as is
+    and left for validation to reject.
+    """
+    scanner = _JsonObjectScanner()
+    end = scanner.feed(text)
+    if scanner.start is None or end is None:
+        return text.strip()
+    return text[scanner.start:end]
+
+
+def _content_delta(chunk: Any) -> Optional[str]:
+    return chunk.choices[0].delta.content if chunk.choices else None
+
+
+def _tool_arguments_delta(chunk: Any) -> Optional[str]:
+    if not chunk.choices:
+        return None
+    tool_calls = chunk.choices[0].delta.tool_calls
+    if not tool_calls or tool_calls[0].function is None:
+        return None
+    return tool_calls[0].function.arguments
+
+
+def _read_json_stream(stream: Any, delta_of: Callable[[Any], Optional[str]]) -> str:
+    buffer = io.StringIO()
+    scanner = _JsonObjectScanner()
+    end: Optional[int] = None
+    try:
+        for chunk in stream:
+            delta = delta_of(chunk)
+            if not delta:
+                continue
+            buffer.write(delta)
+            end = scanner.feed(delta)
+            if end is not None:
+                break
+    finally:
+        stream.close()
+
+    if scanner.start is None or end is None:
+        raise ValueError("LLM stream ended without a complete JSON object.")
+    return buffer.getvalue()[scanner.start:end]
+
+
+async def _aread_json_stream(
+    stream: Any, delta_of: Callable[[Any], Optional[str]]
+) -> str:
+    buffer = io.StringIO()
+    scanner = _JsonObjectScanner()
+    end: Optional[int] = None
+    try:
+        async for chunk in stream:
+            delta = delta_of(chunk)
+            if not delta:
+                continue
+            buffer.write(delta)
+            end = scanner.feed(delta)
+            if end is not None:
+                break
+    finally:
+        await stream.close()
+
+    if scanner.start is None or end is None:
+        raise ValueError("LLM stream ended without a complete JSON object.")
+    return buffer.getvalue()[scanner.start:end]
+
+
+def stream_json_completion(client: openai.OpenAI, **create_kwargs: Any) -> str:
+    """
+    Run a streaming chat completion and return the first top-level JSON
+    object in its output.
+
+    The stream is closed as soon as that object's closing brace arrives, so
+    trailing tokens (and the wait for the stop token) are skipped. Raises
+    ValueError if the model produced no complete object.
+    """
+    _RATE_LIMITER.acquire(
+        estimate_request_tokens(
+            create_kwargs.get("messages", []),
+            create_kwargs.get("max_tokens"),
+        )
+    )
+    stream = client.chat.completions.create(stream=True, **create_kwargs)
+    return _read_json_stream(stream, _content_delta)
+
+
+async def astream_json_completion(client: openai.AsyncOpenAI, **create_kwargs: Any) -> str:
+    """
+    Async variant of stream_json_completion for AsyncOpenAI clients.
+    """
+    await _RATE_LIMITER.aacquire(
+        estimate_request_tokens(
+            create_kwargs.get("messages", []),
+            create_kwargs.get("max_tokens"),
+        )
+    )
+    stream = await client.chat.completions.create(stream=True, **create_kwargs)
+    return await _aread_json_stream(stream, _content_delta)
+
+
+def stream_tool_arguments(client: Any, **create_kwargs: Any) -> str:
+    """
+    Run a streaming chat completion that makes a single tool call and return
+    that call's JSON arguments, closing the stream as soon as they are
+    complete.
+
+    Works with any OpenAI-compatible SDK client (OpenAI, Groq). Requests are
+    not counted against the OpenAI rate limiter, since other providers keep
+    their own budgets. Raises ValueError if no complete arguments object
+    arrived.
+    """
+    stream = client.chat.completions.create(stream=True, **create_kwargs)
+    return _read_json_stream(stream, _tool_arguments_delta)
+
+
+async def astream_tool_arguments(client: Any, **create_kwargs: Any) -> str:
+    """
+    Async variant of stream_tool_arguments.
+    """
+    stream = await client.chat.completions.create(stream=True, **create_kwargs)
+    return await _aread_json_stream(stream, _tool_arguments_delta)
+
+
+_BATCH_TERMINAL_STATUSES = frozenset({"completed", "failed", "expired", "cancelled"})
+
+
+def run_batch_job(
+    client: openai.OpenAI,
+    requests: Sequence[Dict[str, Any]],
+    poll_interval_seconds: float = 30.0,
+    completion_window: str = "24h",
+) -> List[Optional[str]]:
+    """
+    Submit chat completion requests through the OpenAI Batch API and block
+    until the batch finishes.
+
+    Each element of requests is a chat.completions.create body (model,
+    messages, ...). Returns the message content for each request, in order;
+    entries are None for requests that failed or were not processed. Batch
+    jobs are billed at a discount but may take up to completion_window, so
+    this is only meant for offline/bulk runs, never the interactive path.
+    """
+    if not requests:
+        return []
+
+    lines = [
+        json.dumps(
+            {
+                "custom_id": str(index),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": body,
+            },
+            ensure_ascii=False,
+        )
+        for index, body in enumerate(requests)
+    ]
+    input_file = client.files.create(
+        file=("batch.jsonl", "\n".join(lines).encode("utf-8")),
+        purpose="batch",
+    )
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window=completion_window,
+    )
+    while batch.status not in _BATCH_TERMINAL_STATUSES:
+        time.sleep(poll_interval_seconds)
+        batch = client.batches.retrieve(batch.id)
+
+    results: List[Optional[str]] = [None] * len(requests)
+    if batch.output_file_id is None:
+        return results
+
+    for line in client.files.content(batch.output_file_id).text.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        response = record.get("response") or {}
+        if response.get("status_code") != 200:
+            continue
+        choices = (response.get("body") or {}).get("choices") or []
+        if choices:
+            content = choices[0].get("message", {}).get("content")
+            results[int(record["custom_id"])] = (
+                extract_json_object(content) if content else None
+            )
+    return results
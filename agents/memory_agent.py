@@ -1,22 +1,52 @@
 from __future__ import annotations
 
-import json
 import os
 from dataclasses import dataclass
 from typing import Any, Dict, List, Optional
 
-from openai import OpenAI
-from pydantic import BaseModel, ValidationError
+from openai import AsyncOpenAI, OpenAI
+from pydantic import BaseModel, TypeAdapter, ValidationError
 
+from agents.llm_utils import (
+    astream_json_completion,
+    dumps_json,
+    get_async_openai_client,
+    get_openai_client,
+    retry_with_exponential_backoff,
+    stream_json_completion,
+)
 from core.models import (
     DebugOutput,
     IntentClassificationOutput,
     MemoryContext,
+    OverallTestStatus,
     StyleMode,
     TestingOutput,
 )
 
 
+# Kept as a module constant so every call and retry sends a byte-identical
+# prefix, which lets the provider's automatic prompt caching reuse it.
+_MEMORY_SYSTEM_PROMPT = (
+    "You are the memory component of the CodePilot software engineering "
+    "agent. From the execution outputs, extract the user's preferences "
+    "(language, style mode), recurring weaknesses and a brief interaction "
+    "summary as one JSON object.\n"
+    "- Infer preferences from observed choices (e.g. Python intent means "
+    "prefer Python).\n"
+    "- Take mistakes from test failures and debug root causes; "
+    "mistake_descriptions must align one-to-one with mistake_categories.\n"
+    "- Group similar mistakes into high-level recurring_weaknesses.\n"
+    "- preferred_style_mode is readable, competitive, enterprise or null.\n"
+    "- Keep interaction_summary to 1-2 sentences.\n"
+)
+
+
+# LLM-supplied style modes are mapped with a dict lookup; unknown values map
+# to None without raising.
+_STYLE_MODE_MAP: Dict[str, StyleMode] = {mode.value: mode for mode in StyleMode}
+
+
 @dataclass
 class MemoryAgentConfig:
     """
@@ -48,6 +78,37 @@ class _MemoryUpdate(BaseModel):
     interaction_summary: Optional[str] = None
 
 
+_MEMORY_UPDATE_ADAPTER: TypeAdapter[_MemoryUpdate] = TypeAdapter(_MemoryUpdate)
+
+
+# The reply's shape is enforced through response_format instead of being
+# restated in the prompt. strict=False because strict structured outputs
+# require every property to be required, which _MemoryUpdate's defaulted
+# fields do not satisfy. Built once at import.
+_MEMORY_RESPONSE_FORMAT: Dict[str, Any] = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "MemoryUpdate",
+        "schema": _MemoryUpdate.model_json_schema(),
+        "strict": False,
+    },
+}
+
+
+def _has_new_signal(
+    testing: Optional[TestingOutput],
+    debug: Optional[DebugOutput],
+) -> bool:
+    """
+    Whether the run produced anything worth an LLM call. Preferences are read
+    straight off the intent and a clean run's summary is templated, so only
+    failures need the model to name mistakes and weaknesses.
+    """
+    if debug is not None and debug.root_causes:
+        return True
+    return testing is not None and testing.overall_status != OverallTestStatus.ALL_PASSED
+
+
 class MemoryAgent:
     """
     LLM-backed memory agent that extracts user preferences and recurring
@@ -68,9 +129,11 @@ class MemoryAgent:
         self,
         client: OpenAI,
         config: Optional[MemoryAgentConfig] = None,
+        async_client: Optional[AsyncOpenAI] = None,
     ) -> None:
         self._client = client
         self._config = config or MemoryAgentConfig()
+        self._async_client = async_client
 
     def extract_updates(
         self,
@@ -78,6 +141,7 @@ class MemoryAgent:
         testing: Optional[TestingOutput],
         debug: Optional[DebugOutput],
         existing_context: Optional[MemoryContext],
+        infer: bool = True,
     ) -> Dict[str, Any]:
         """
         Extract structured memory updates from execution outputs.
@@ -89,7 +153,8 @@ class MemoryAgent:
           - interaction_summary: Optional[str]
 
         If LLM extraction fails, falls back to deterministic heuristics based
-        on the provided outputs.
+        on the provided outputs. The LLM is skipped when the run had no
+        failures, or when infer is False.
         """
         if not intent and not testing and not debug:
             # No execution data to analyze; return empty updates.
@@ -100,20 +165,34 @@ class MemoryAgent:
                 "interaction_summary": None,
             }
 
-        last_error: Optional[Exception] = None
-        update: Optional[_MemoryUpdate] = None
-
-        for _attempt in range(self._config.max_retries + 1):
-            try:
-                raw_json = self._invoke_llm(
+        if not infer or not _has_new_signal(testing, debug):
+            return self._to_updates(
+                self._heuristic_extraction(
                     intent=intent,
                     testing=testing,
                     debug=debug,
                     existing_context=existing_context,
+                    error=None,
                 )
-                update = _MemoryUpdate.model_validate(raw_json)
+            )
+
+        execution_summary = self._build_execution_summary(
+            intent=intent,
+            testing=testing,
+            debug=debug,
+            existing_context=existing_context,
+        )
+        messages = self._build_messages(execution_summary)
+
+        last_error: Optional[Exception] = None
+        update: Optional[_MemoryUpdate] = None
+
+        for _attempt in range(self._config.max_retries + 1):
+            try:
+                raw_json = self._invoke_llm(messages)
+                update = _MEMORY_UPDATE_ADAPTER.validate_json(raw_json)
                 break
-            except (json.JSONDecodeError, ValidationError, KeyError, TypeError) as exc:
+            except (ValidationError, ValueError) as exc:
                 last_error = exc
                 continue
 
@@ -127,70 +206,29 @@ class MemoryAgent:
                 error=last_error,
             )
 
-        # Convert to the format expected by orchestration.
-        preferred_style_mode: Optional[StyleMode] = None
-        if update.preferred_style_mode:
-            try:
-                preferred_style_mode = StyleMode(update.preferred_style_mode.lower())
-            except ValueError:
-                preferred_style_mode = None
-
-        mistakes: List[Dict[str, str]] = []
-        for category, description in zip(
-            update.mistake_categories,
-            update.mistake_descriptions,
-        ):
-            if category and description:
-                mistakes.append({"category": category, "description": description})
-
-        return {
-            "preferred_language": (
-                update.preferred_language.lower().strip()
-                if update.preferred_language
-                else None
-            ),
-            "preferred_style_mode": preferred_style_mode,
-            "mistakes": mistakes,
-            "interaction_summary": update.interaction_summary,
-        }
+        return self._to_updates(update)
 
-    def _invoke_llm(
+    async def aextract_updates(
         self,
         intent: Optional[IntentClassificationOutput],
         testing: Optional[TestingOutput],
         debug: Optional[DebugOutput],
         existing_context: Optional[MemoryContext],
+        infer: bool = True,
     ) -> Dict[str, Any]:
         """
-        Call the LLM to extract memory updates from execution outputs.
-
-        The LLM is asked to infer user preferences and recurring weaknesses
-        based on observed behavior patterns.
+        Async counterpart of extract_updates backed by the AsyncOpenAI client.
         """
-        system_prompt = (
-            "You are the memory component of a software engineering agent called "
-            "CodePilot.\n\n"
-            "Your task is to analyze execution outputs and extract:\n"
-            "1. User preferences (preferred programming language, code style mode)\n"
-            "2. Recurring weaknesses (mistake categories and descriptions)\n"
-            "3. A brief interaction summary\n\n"
-            "You MUST respond with a STRICT JSON object matching this schema:\n\n"
-            "{\n"
-            '  \"preferred_language\": string or null (e.g., \"python\"),\n'
-            '  \"preferred_style_mode\": one of [\"readable\", \"competitive\", \"enterprise\"] or null,\n'
-            '  \"recurring_weaknesses\": [list of high-level weakness categories],\n'
-            '  \"mistake_categories\": [list of specific mistake category strings],\n'
-            '  \"mistake_descriptions\": [list of mistake description strings, same length as categories],\n'
-            '  \"interaction_summary\": string or null (brief summary of this interaction)\n'
-            "}\n\n"
-            "Guidelines:\n"
-            "- Infer preferences from observed choices (e.g., if intent shows Python, "
-            "prefer Python).\n"
-            "- Extract weaknesses from test failures and debug root causes.\n"
-            "- Group similar mistakes into recurring_weaknesses.\n"
-            "- Keep interaction_summary concise (1-2 sentences).\n"
-            "- Do NOT include markdown, comments, or text outside the JSON.\n"
-        )
+        async_client = self._async_client
+        if async_client is None:
+            raise RuntimeError(
+                "MemoryAgent.aextract_updates requires an AsyncOpenAI client."
+            )
+
+        if not infer or not _has_new_signal(testing, debug):
+            return self.extract_updates(
+                intent, testing, debug, existing_context, infer=False
+            )
 
         execution_summary = self._build_execution_summary(
             intent=intent,
@@ -198,28 +236,114 @@ class MemoryAgent:
             debug=debug,
             existing_context=existing_context,
         )
+        messages = self._build_messages(execution_summary)
 
+        last_error: Optional[Exception] = None
+        update: Optional[_MemoryUpdate] = None
+
+        for _attempt in range(self._config.max_retries + 1):
+            try:
+                raw_json = await self._ainvoke_llm(async_client, messages)
+                update = _MEMORY_UPDATE_ADAPTER.validate_json(raw_json)
+                break
+            except (ValidationError, ValueError) as exc:
+                last_error = exc
+                continue
+
+        if update is None:
+            update = self._heuristic_extraction(
+                intent=intent,
+                testing=testing,
+                debug=debug,
+                existing_context=existing_context,
+                error=last_error,
+            )
+
+        return self._to_updates(update)
+
+    def _to_updates(self, update: _MemoryUpdate) -> Dict[str, Any]:
+        """
+        Convert a validated or heuristic update to the format expected by
+        orchestration.
+        """
+        preferred_style_mode = (
+            _STYLE_MODE_MAP.get(update.preferred_style_mode.lower())
+            if update.preferred_style_mode
+            else None
+        )
+
+        mistakes: List[Dict[str, str]] = [
+            {"category": category, "description": description}
+            for category, description in zip(
+                update.mistake_categories,
+                update.mistake_descriptions,
+            )
+            if category and description
+        ]
+
+        return {
+            "preferred_language": (
+                update.preferred_language.lower().strip()
+                if update.preferred_language
+                else None
+            ),
+            "preferred_style_mode": preferred_style_mode,
+            "mistakes": mistakes,
+            "interaction_summary": update.interaction_summary,
+        }
+
+    def _build_messages(self, execution_summary: Dict[str, Any]) -> List[Dict[str, str]]:
+        """
+        Build the chat messages for one extraction; built once per call and
+        reused across retries.
+        """
+        # Static instructions first and the per-call summary last, so the
+        # cacheable prefix extends into the user message.
         user_prompt = (
+            "Extract user preferences and recurring weaknesses from the "
+            "execution outputs below.\n\n"
             "Execution outputs to analyze:\n"
-            f"{json.dumps(execution_summary, ensure_ascii=False, indent=2)}\n\n"
-            "Extract user preferences and recurring weaknesses from this data."
+            f"{dumps_json(execution_summary)}"
         )
+        return [
+            {"role": "system", "content": _MEMORY_SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt},
+        ]
 
-        response = self._client.chat.completions.create(
+    @retry_with_exponential_backoff()
+    def _invoke_llm(self, messages: List[Dict[str, str]]) -> str:
+        """
+        Call the LLM to extract memory updates from execution outputs.
+
+        The LLM is asked to infer user preferences and recurring weaknesses
+        based on observed behavior patterns. The reply is streamed and the
+        stream closed as soon as the JSON object is complete.
+        """
+        return stream_json_completion(
+            self._client,
             model=self._config.model,
             temperature=self._config.temperature,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
+            response_format=_MEMORY_RESPONSE_FORMAT,
+            messages=messages,
         )
 
-        content = response.choices[0].message.content
-        if content is None:
-            raise ValueError("LLM returned empty content for memory extraction.")
-
-        content = content.strip()
-        return json.loads(content)
+    @retry_with_exponential_backoff()
+    async def _ainvoke_llm(
+        self,
+        async_client: AsyncOpenAI,
+        messages: List[Dict[str, str]],
+    ) -> str:
+        """
+        Async variant of _invoke_llm; transient API errors are retried with
+        backoff.
+        """
+        return await astream_json_completion(
+            async_client,
+            model=self._config.model,
+            temperature=self._config.temperature,
+            response_format=_MEMORY_RESPONSE_FORMAT,
+            messages=messages,
+        )
 
     def _build_execution_summary(
         self,
@@ -322,7 +446,7 @@ class MemoryAgent:
 
         mistake_categories: List[str] = []
         mistake_descriptions: List[str] = []
-        recurring_weaknesses: List[str] = []
+        inferred_weaknesses: List[str] = []
 
         if debug and debug.root_causes:
             for rc in debug.root_causes:
@@ -336,17 +460,16 @@ class MemoryAgent:
                 # Infer weakness category from description keywords.
                 desc_lower = rc.description.lower()
                 if "timeout" in desc_lower or "performance" in desc_lower:
-                    if "performance" not in recurring_weaknesses:
-                        recurring_weaknesses.append("performance")
+                    inferred_weaknesses.append("performance")
                 elif "memory" in desc_lower or "resource" in desc_lower:
-                    if "resource_management" not in recurring_weaknesses:
-                        recurring_weaknesses.append("resource_management")
+                    inferred_weaknesses.append("resource_management")
                 elif "edge" in desc_lower or "boundary" in desc_lower:
-                    if "edge_case_handling" not in recurring_weaknesses:
-                        recurring_weaknesses.append("edge_case_handling")
+                    inferred_weaknesses.append("edge_case_handling")
                 else:
-                    if "logic_error" not in recurring_weaknesses:
-                        recurring_weaknesses.append("logic_error")
+                    inferred_weaknesses.append("logic_error")
+
+        # Deduplicate once, keeping first-seen order.
+        recurring_weaknesses = list(dict.fromkeys(inferred_weaknesses))
 
         interaction_summary: Optional[str] = None
         if intent and testing:
@@ -357,7 +480,8 @@ class MemoryAgent:
                 f"{len(testing.passed_cases)}/{len(testing.test_cases)} passed."
             )
 
-        return _MemoryUpdate(
+        # Built from validated outputs and literals, so validation is skipped.
+        return _MemoryUpdate.model_construct(
             preferred_language=preferred_language,
             preferred_style_mode=preferred_style_mode,
             recurring_weaknesses=recurring_weaknesses,
@@ -377,5 +501,8 @@ def create_default_memory_agent() -> MemoryAgent:
     """
     model = os.getenv("CODEPILOT_MEMORY_MODEL", MemoryAgentConfig.model)
     config = MemoryAgentConfig(model=model)
-    client = OpenAI()
-    return MemoryAgent(client=client, config=config)
+    return MemoryAgent(
+        client=get_openai_client(),
+        config=config,
+        async_client=get_async_openai_client(),
+    )
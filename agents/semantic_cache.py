@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from core.cache import LRUCache
+from core.models import IntentClassificationOutput
+
+
+@dataclass
+class SemanticCacheConfig:
+    """
+    Configuration for SemanticIntentCache.
+
+    Attributes:
+        enabled: When False, lookups always miss and nothing is stored.
+        threshold: Minimum cosine similarity for a stored problem to count as
+            a paraphrase of the incoming one.
+        max_entries: Maximum number of problems kept per namespace; the
+            oldest entry is dropped once the limit is reached.
+        model_name: sentence-transformers model used to embed problems.
+        persist_dir: Directory the indexes are saved to and loaded from;
+            None keeps them in memory only.
+    """
+
+    enabled: bool = False
+    threshold: float = 0.92
+    max_entries: int = 10_000
+    model_name: str = "sentence-transformers/all-MiniLM-L6-v2"
+    persist_dir: Optional[str] = None
+
+    @classmethod
+    def from_env(cls) -> "SemanticCacheConfig":
+        """
+        Build a config from CODEPILOT_SEMANTIC_CACHE ("1" enables the cache)
+        and CODEPILOT_SEMANTIC_CACHE_DIR.
+        """
+        return cls(
+            enabled=os.getenv("CODEPILOT_SEMANTIC_CACHE", "0") == "1",
+            persist_dir=os.getenv("CODEPILOT_SEMANTIC_CACHE_DIR") or None,
+        )
+
+
+class _Namespace:
+    """
+    One inner-product index plus the classifications stored alongside it, in
+    insertion order.
+    """
+
+    def __init__(self, index: Any, outputs: List[IntentClassificationOutput]) -> None:
+        self.index = index
+        self.outputs = outputs
+
+
+class SemanticIntentCache:
+    """
+    Nearest-neighbour cache of intent classifications for paraphrased problems.
+
+    Problems are embedded with a small local sentence-transformers model and
+    kept in a faiss IndexFlatIP; vectors are normalized so the inner product
+    is the cosine similarity. Entries are partitioned by a namespace (the
+    classifier passes its memory hint) because the same problem classifies
+    differently for users with different preferences.
+
+    sentence-transformers, faiss and numpy are optional dependencies and are
+    imported on first use, so a disabled cache costs nothing.
+    """
+
+    def __init__(self, config: Optional[SemanticCacheConfig] = None) -> None:
+        self._config = config or SemanticCacheConfig()
+        self._namespaces: Dict[str, _Namespace] = {}
+        self._lock = threading.Lock()
+        self._model: Any = None
+        self._model_lock = threading.Lock()
+        # Classify embeds the problem for the lookup and again for the store
+        # on a miss; remembering recent vectors makes the second call free.
+        self._vectors: LRUCache[Any] = LRUCache(maxsize=64)
+
+    @property
+    def enabled(self) -> bool:
+        return self._config.enabled
+
+    def lookup(
+        self, problem: str, namespace: str
+    ) -> Optional[IntentClassificationOutput]:
+        """
+        Return the stored classification most similar to problem, or None if
+        nothing in the namespace reaches the similarity threshold.
+        """
+        if not self._config.enabled:
+            return None
+
+        vector = self._embed(problem)
+        with self._lock:
+            ns = self._namespace(namespace)
+            if ns.index.ntotal == 0:
+                return None
+            scores, ids = ns.index.search(vector, 1)
+            if scores[0][0] < self._config.threshold:
+                return None
+            return ns.outputs[int(ids[0][0])]
+
+    def store(
+        self, problem: str, namespace: str, output: IntentClassificationOutput
+    ) -> None:
+        """
+        Remember output as the classification for problem.
+        """
+        if not self._config.enabled:
+            return
+
+        import numpy as np
+
+        vector = self._embed(problem)
+        with self._lock:
+            ns = self._namespace(namespace)
+            if ns.index.ntotal >= self._config.max_entries:
+                ns.index.remove_ids(np.array([0], dtype=np.int64))
+                del ns.outputs[0]
+            ns.index.add(vector)
+            ns.outputs.append(output)
+
+    def save(self) -> None:
+        """
+        Write every namespace to persist_dir; a no-op when it is unset.
+        """
+        if not self._config.enabled or self._config.persist_dir is None:
+            return
+
+        import faiss
+
+        directory = Path(self._config.persist_dir)
+        directory.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            for namespace, ns in self._namespaces.items():
+                stem = directory / self._namespace_digest(namespace)
+                faiss.write_index(ns.index, str(stem.with_suffix(".faiss")))
+                stem.with_suffix(".jsonl").write_text(
+                    "".join(o.model_dump_json() + "\n" for o in ns.outputs),
+                    encoding="utf-8",
+                )
+
+    def _namespace(self, namespace: str) -> _Namespace:
+        # Caller holds self._lock.
+        ns = self._namespaces.get(namespace)
+        if ns is None:
+            ns = self._load_namespace(namespace) or self._new_namespace()
+            self._namespaces[namespace] = ns
+        return ns
+
+    def _new_namespace(self) -> _Namespace:
+        import faiss
+
+        dimension = self._get_model().get_sentence_embedding_dimension()
+        return _Namespace(faiss.IndexFlatIP(dimension), [])
+
+    def _load_namespace(self, namespace: str) -> Optional[_Namespace]:
+        if self._config.persist_dir is None:
+            return None
+
+        stem = Path(self._config.persist_dir) / self._namespace_digest(namespace)
+        index_path = stem.with_suffix(".faiss")
+        outputs_path = stem.with_suffix(".jsonl")
+        if not index_path.exists() or not outputs_path.exists():
+            return None
+
+        import faiss
+
+        index = faiss.read_index(str(index_path))
+        outputs = [
+            IntentClassificationOutput.model_validate_json(line)
+            for line in outputs_path.read_text(encoding="utf-8").splitlines()
+            if line
+        ]
+        if index.ntotal != len(outputs):
+            return None
+        return _Namespace(index, outputs)
+
+    @staticmethod
+    def _namespace_digest(namespace: str) -> str:
+        return hashlib.blake2b(namespace.encode("utf-8"), digest_size=16).hexdigest()
+
+    def _embed(self, problem: str) -> Any:
+        vector = self._vectors.get(problem)
+        if vector is None:
+            vector = self._get_model().encode(
+                [problem],
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+            ).astype("float32")
+            self._vectors.put(problem, vector)
+        return vector
+
+    def _get_model(self) -> Any:
+        with self._model_lock:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+
+                self._model = SentenceTransformer(self._config.model_name)
+            return self._model
@@ -1,15 +1,31 @@
+import asyncio
+import functools
+
 from fastapi import FastAPI
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse, Response
+from pydantic import BaseModel, TypeAdapter
 from pathlib import Path
+from typing import Optional
 
+from agents.llm_utils import aclose_http_clients
+from core.cache import LRUCache
+from core.models import (
+    CodeOutput,
+    DebugOutput,
+    IntentClassificationOutput,
+    PlanningOutput,
+    TestingOutput,
+    build_models,
+)
 from core.state import CoreState
 from core.orchestration import (
-    compile_orchestration_graph,
+    compile_async_orchestration_graph,
     create_default_sqlite_storage,
+    warm_up_agents,
 )
 
 # -------------------- APP --------------------
-app = FastAPI(title="CodePilot API")
+app = FastAPI(title="CodePilot API", default_response_class=ORJSONResponse)
 
 # -------------------- HEALTH CHECK --------------------
 # Render sends GET + HEAD requests to /
@@ -18,17 +34,69 @@ def root():
     return {"status": "ok", "service": "CodePilot API"}
 
 # -------------------- PIPELINE SETUP --------------------
-storage = create_default_sqlite_storage(Path("memory.db"))
-run_pipeline = compile_orchestration_graph(storage)
+# Built at server startup and shared by every request afterwards; importing
+# the app (e.g. for tooling) still does not open the database or compile the
+# graph.
+@functools.lru_cache(maxsize=None)
+def get_storage():
+    return create_default_sqlite_storage(Path("memory.db"))
+
+
+# Repeat submissions of a solved problem (all tests passed) by the same user
+# within the TTL are answered from memory instead of re-running the pipeline.
+SOLVE_RESULT_CACHE_SIZE = 256
+SOLVE_RESULT_CACHE_TTL_SECONDS = 600.0
+
+
+@functools.lru_cache(maxsize=None)
+def get_pipeline():
+    return compile_async_orchestration_graph(
+        get_storage(),
+        result_cache=LRUCache(
+            maxsize=SOLVE_RESULT_CACHE_SIZE,
+            ttl_seconds=SOLVE_RESULT_CACHE_TTL_SECONDS,
+        ),
+    )
+
+
+@app.on_event("startup")
+def build_pipeline():
+    # Pay for model schemas, the database, graph compilation and agent
+    # clients before the first /solve rather than during it.
+    build_models()
+    get_pipeline()
+    get_storage().warm_up()
+    warm_up_agents()
+
+
+@app.on_event("shutdown")
+async def close_resources():
+    await aclose_http_clients()
+    if get_storage.cache_info().currsize:
+        get_storage().close()
 
 # -------------------- MODELS --------------------
 class ProblemRequest(BaseModel):
     problem: str
     user_id: str | None = None
 
+
+class SolveResponse(BaseModel):
+    intent: Optional[IntentClassificationOutput] = None
+    plan: Optional[PlanningOutput] = None
+    code: Optional[CodeOutput] = None
+    tests: Optional[TestingOutput] = None
+    debug: Optional[DebugOutput] = None
+
+
+_SOLVE_BATCH_ADAPTER = TypeAdapter(list[SolveResponse])
+
+
+def _json_response(body: str | bytes) -> Response:
+    return Response(content=body, media_type="application/json")
+
 # -------------------- API --------------------
-@app.post("/solve")
-def solve_problem(request: ProblemRequest):
+async def _solve(request: ProblemRequest) -> SolveResponse:
     state = CoreState(
         state_version="1.0",
         request_id="web_request",
@@ -36,12 +104,36 @@ def solve_problem(request: ProblemRequest):
         user_id=request.user_id,
     )
 
-    final_state = run_pipeline(state)
+    final_state = await get_pipeline()(state)
+
+    return SolveResponse(
+        intent=final_state.intent_result,
+        plan=final_state.planning_result,
+        code=final_state.code_result,
+        tests=final_state.test_result,
+        debug=final_state.debug_result,
+    )
+
+
+# The agent outputs are serialized to JSON bytes in one pydantic-core pass;
+# returning a Response directly skips FastAPI's jsonable_encoder walk, while
+# response_model still documents the shape in the OpenAPI schema.
+@app.post("/solve", response_model=SolveResponse)
+async def solve_problem(request: ProblemRequest):
+    return _json_response((await _solve(request)).model_dump_json())
+
+
+# Pipelines in one /solve_batch call that run at the same time.
+SOLVE_BATCH_CONCURRENCY = 4
+
+
+@app.post("/solve_batch", response_model=list[SolveResponse])
+async def solve_problems(requests: list[ProblemRequest]):
+    semaphore = asyncio.Semaphore(SOLVE_BATCH_CONCURRENCY)
+
+    async def solve_one(request: ProblemRequest) -> SolveResponse:
+        async with semaphore:
+            return await _solve(request)
 
-    return {
-        "intent": final_state.intent_result,
-        "plan": final_state.planning_result,
-        "code": final_state.code_result,
-        "tests": final_state.test_result,
-        "debug": final_state.debug_result,
-    }
+    results = await asyncio.gather(*(solve_one(r) for r in requests))
+    return _json_response(_SOLVE_BATCH_ADAPTER.dump_json(results))
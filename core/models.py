@@ -1,6 +1,6 @@
 # core/models.py
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from enum import Enum
 from typing import List, Optional, Any, Dict
 
@@ -59,7 +59,25 @@ class FailureType(str, Enum):
 # Core data models
 # --------------------
 
-class MemoryContext(BaseModel):
+class _Base(BaseModel):
+    # Validators are built on first use instead of at import, so tooling that
+    # only imports these models does not pay for every schema.
+    model_config = ConfigDict(defer_build=True, extra="ignore")
+
+
+def build_models() -> None:
+    """
+    Build every deferred model schema now, e.g. at server startup, so the
+    first request does not pay for it.
+    """
+    for model in _Base.__subclasses__():
+        model.model_rebuild()
+
+
+class MemoryContext(_Base):
+    # Frozen so nodes replace the context instead of mutating a shared one.
+    model_config = ConfigDict(frozen=True)
+
     preferred_language: str = "python"
     preferred_style_mode: StyleMode = StyleMode.READABLE
     common_mistakes: List[str] = []
@@ -67,7 +85,7 @@ class MemoryContext(BaseModel):
     last_interaction_summary: Optional[str] = None
 
 
-class IntentConstraints(BaseModel):
+class IntentConstraints(_Base):
     time_complexity_target: Optional[str] = None
     space_complexity_target: Optional[str] = None
     memory_limit_mb: Optional[int] = None
@@ -75,12 +93,15 @@ class IntentConstraints(BaseModel):
     additional_constraints: List[str] = []
 
 
-class StylePreferences(BaseModel):
+class StylePreferences(_Base):
     language: Optional[str] = None
     style_mode: Optional[StyleMode] = None
 
 
-class IntentClassificationOutput(BaseModel):
+class IntentClassificationOutput(_Base):
+    # Frozen so cached classifications can be shared between requests.
+    model_config = ConfigDict(frozen=True)
+
     problem_type: ProblemType
     context: ProblemContext
     languages: List[str]
@@ -90,7 +111,7 @@ class IntentClassificationOutput(BaseModel):
     raw_json: Optional[Dict[str, Any]] = None
 
 
-class SolutionApproach(BaseModel):
+class SolutionApproach(_Base):
     id: str
     name: str
     high_level_steps: List[str]
@@ -100,7 +121,10 @@ class SolutionApproach(BaseModel):
     suitable_for: List[str]
 
 
-class PlanningOutput(BaseModel):
+class PlanningOutput(_Base):
+    # Frozen so validated plans can be cached and shared between callers.
+    model_config = ConfigDict(frozen=True)
+
     problem_restated: str
     assumptions: List[str]
     approaches: List[SolutionApproach]
@@ -108,7 +132,10 @@ class PlanningOutput(BaseModel):
     selected_approach_justification: str
 
 
-class CodeOutput(BaseModel):
+class CodeOutput(_Base):
+    # Frozen so a node's output can be shared by later states unchanged.
+    model_config = ConfigDict(frozen=True)
+
     language: str
     style_mode: StyleMode
     source_files: Dict[str, str]
@@ -116,7 +143,7 @@ class CodeOutput(BaseModel):
     notes_for_tester: List[str]
 
 
-class TestCase(BaseModel):
+class TestCase(_Base):
     id: str
     description: str
     input_payload: Any
@@ -124,7 +151,7 @@ class TestCase(BaseModel):
     type: TestCaseType
 
 
-class TestFailure(BaseModel):
+class TestFailure(_Base):
     case_id: str
     failure_type: FailureType
     error_message: str
@@ -132,7 +159,10 @@ class TestFailure(BaseModel):
     actual_output: Optional[Any] = None
 
 
-class TestingOutput(BaseModel):
+class TestingOutput(_Base):
+    # Frozen so a node's output can be shared by later states unchanged.
+    model_config = ConfigDict(frozen=True)
+
     test_cases: List[TestCase]
     passed_cases: List[str] = []
     failed_cases: List[str] = []
@@ -140,21 +170,24 @@ class TestingOutput(BaseModel):
     overall_status: OverallTestStatus
 
 
-class RootCauseAnalysis(BaseModel):
+class RootCauseAnalysis(_Base):
     id: str
     description: str
     failed_assumptions: List[str]
     impacted_test_case_ids: List[str]
 
 
-class FixProposal(BaseModel):
+class FixProposal(_Base):
     id: str
     target_root_cause_ids: List[str]
     description: str
     notes_for_coder: List[str]
 
 
-class DebugOutput(BaseModel):
+class DebugOutput(_Base):
+    # Frozen so validated analyses can be cached and shared between callers.
+    model_config = ConfigDict(frozen=True)
+
     root_causes: List[RootCauseAnalysis] = []
     proposed_fixes: List[FixProposal] = []
     selected_fix_id: Optional[str] = None
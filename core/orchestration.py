@@ -1,28 +1,28 @@
 from __future__ import annotations
 
-from datetime import datetime, timezone
+import asyncio
+import functools
+import hashlib
+import importlib
+import threading
+import time
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Callable
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Sequence, TypeVar
 
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import END, START, StateGraph
 
 # =======================
 # ABSOLUTE CORE IMPORTS
 # =======================
 
+from core.cache import LRUCache
 from core.models import (
-    CodeOutput,
-    DebugOutput,
+    IntentClassificationOutput,
     MemoryContext,
     OverallTestStatus,
-    PlanningOutput,
-    RootCauseAnalysis,
-    SolutionApproach,
     StyleMode,
-    TestCase,
-    TestCaseType,
-    TestFailure,
-    TestingOutput,
 )
 from core.state import CoreState, StepLogEntry
 
@@ -30,21 +30,15 @@ from core.state import CoreState, StepLogEntry
 # ABSOLUTE AGENT IMPORTS
 # =======================
 
-from agents.intent_classifier import (
-    IntentClassifierAgent,
-    create_default_intent_classifier,
-)
-from agents.engineering_planner import (
-    EngineeringPlannerAgent,
-    create_default_engineering_planner,
-)
-from agents.coder import CoderAgent, create_default_coder
-from agents.adversarial_tester import (
-    AdversarialTesterAgent,
-    create_default_adversarial_tester,
-)
-from agents.debugger import DebuggerAgent, create_default_debugger
-from agents.memory_agent import MemoryAgent, create_default_memory_agent
+# The agent modules pull in the LLM SDKs, so they are imported by the _get_*
+# accessors on first use rather than with this module.
+if TYPE_CHECKING:
+    from agents.intent_classifier import IntentClassifierAgent
+    from agents.engineering_planner import EngineeringPlannerAgent
+    from agents.coder import CoderAgent
+    from agents.adversarial_tester import AdversarialTesterAgent
+    from agents.debugger import DebuggerAgent
+    from agents.memory_agent import MemoryAgent
 
 # =======================
 # ABSOLUTE MEMORY IMPORTS
@@ -54,24 +48,91 @@ from memory.storage_base import MemoryStorage
 from memory.sqlite_storage import SQLiteMemoryStorage, SQLiteConfig
 
 
+# Agent names this module used to import eagerly; still resolvable as
+# attributes (PEP 562) for callers that import them from here.
+_LAZY_AGENT_EXPORTS = {
+    "IntentClassifierAgent": "agents.intent_classifier",
+    "create_default_intent_classifier": "agents.intent_classifier",
+    "EngineeringPlannerAgent": "agents.engineering_planner",
+    "create_default_engineering_planner": "agents.engineering_planner",
+    "CoderAgent": "agents.coder",
+    "create_default_coder": "agents.coder",
+    "AdversarialTesterAgent": "agents.adversarial_tester",
+    "create_default_adversarial_tester": "agents.adversarial_tester",
+    "DebuggerAgent": "agents.debugger",
+    "create_default_debugger": "agents.debugger",
+    "MemoryAgent": "agents.memory_agent",
+    "create_default_memory_agent": "agents.memory_agent",
+}
+
+
+def __getattr__(name: str) -> Any:
+    module = _LAZY_AGENT_EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(module), name)
+
+
+_T = TypeVar("_T")
+
+
+def _once(factory: Callable[[], _T]) -> Callable[[], _T]:
+    """
+    Wrap a zero-argument factory so it runs at most once, even when the first
+    calls race; later calls return the stored value without locking.
+    cache_clear() forgets the value, e.g. for tests that inject agents.
+    """
+    lock = threading.Lock()
+    unset = object()
+    value: Any = unset
+
+    @functools.wraps(factory)
+    def get() -> _T:
+        nonlocal value
+        if value is unset:
+            with lock:
+                if value is unset:
+                    value = factory()
+        return value
+
+    def cache_clear() -> None:
+        nonlocal value
+        with lock:
+            value = unset
+
+    get.cache_clear = cache_clear  # type: ignore[attr-defined]
+    return get
+
+
 MAX_DEBUG_ITERATIONS = 2
 
+# Default number of graph runs in flight at once in a batch.
+BATCH_MAX_CONCURRENCY = 32
+
 
 def _now_utc() -> datetime:
     return datetime.now(timezone.utc)
 
 
+# Nodes return only the channels they changed; LangGraph merges the delta into
+# its own state, so the incoming state is never copied. execution_log has an
+# operator.add reducer, so a delta carries just the node's own log entry.
+StateDelta = Dict[str, Any]
+
+
 def _log_step(
     state: CoreState,
     step_name: str,
-    started_at: datetime,
+    started_ns: int,
+    updates: StateDelta | None = None,
     error: str | None = None,
-) -> CoreState:
+) -> StateDelta:
+    # Nodes time themselves with the monotonic perf counter; the wall clock
+    # is read once here and the start time derived from the duration.
+    duration_us = (time.perf_counter_ns() - started_ns) // 1_000
     finished_at = _now_utc()
-    duration_ms = max(
-        0,
-        int((finished_at - started_at).total_seconds() * 1000),
-    )
+    started_at = finished_at - timedelta(microseconds=duration_us)
+    duration_ms = duration_us // 1_000
 
     entry = StepLogEntry(
         step_name=step_name,
@@ -83,214 +144,345 @@ def _log_step(
         error=error,
     )
 
-    new_state = state.model_copy(deep=True)
-    new_state.execution_log.append(entry)
-    return new_state
+    delta = dict(updates) if updates else {}
+    delta["execution_log"] = [entry]
+    return delta
 
 
-def _count_debug_iterations(state: CoreState) -> int:
-    return sum(1 for entry in state.execution_log if entry.step_name == "debugger")
+# MemoryContext is frozen, so every user-less run can share one instance.
+_DEFAULT_MEMORY_CONTEXT = MemoryContext.model_construct(
+    preferred_language="python",
+    preferred_style_mode=StyleMode.READABLE,
+    common_mistakes=[],
+    repeated_weaknesses=[],
+    last_interaction_summary=None,
+)
 
 
 def _default_memory_context() -> MemoryContext:
-    return MemoryContext(
-        preferred_language="python",
-        preferred_style_mode=StyleMode.READABLE,
-        common_mistakes=[],
-        repeated_weaknesses=[],
-        last_interaction_summary=None,
-    )
+    return _DEFAULT_MEMORY_CONTEXT
 
 
 # ---------------------------------------------------------------------------
 # Memory nodes
 # ---------------------------------------------------------------------------
 
-def make_memory_load_node(storage: MemoryStorage) -> Callable[[CoreState], CoreState]:
-    def memory_load(state: CoreState) -> CoreState:
-        started_at = _now_utc()
-        new_state = state.model_copy(deep=True)
+def make_memory_load_node(storage: MemoryStorage) -> RunnableLambda:
+    def memory_load(state: CoreState) -> StateDelta:
+        started_ns = time.perf_counter_ns()
 
-        if new_state.user_id:
-            new_state.memory_context = storage.load_context(new_state.user_id)
-        elif new_state.memory_context is None:
-            new_state.memory_context = _default_memory_context()
+        updates: StateDelta = {}
+        if state.user_id:
+            updates["memory_context"] = storage.load_context(state.user_id)
+        elif state.memory_context is None:
+            updates["memory_context"] = _default_memory_context()
 
-        return _log_step(new_state, "memory_load", started_at)
+        return _log_step(state, "memory_load", started_ns, updates)
 
-    return memory_load
+    async def amemory_load(state: CoreState) -> StateDelta:
+        started_ns = time.perf_counter_ns()
 
+        updates: StateDelta = {}
+        if state.user_id:
+            # SQLite reads block, so keep them off the event loop.
+            updates["memory_context"] = await asyncio.to_thread(
+                storage.load_context, state.user_id
+            )
+        elif state.memory_context is None:
+            updates["memory_context"] = _default_memory_context()
 
-_DEFAULT_MEMORY_AGENT: MemoryAgent | None = None
+        return _log_step(state, "memory_load", started_ns, updates)
 
+    return RunnableLambda(memory_load, afunc=amemory_load)
 
+
+@_once
 def _get_memory_agent() -> MemoryAgent:
-    global _DEFAULT_MEMORY_AGENT
-    if _DEFAULT_MEMORY_AGENT is None:
-        _DEFAULT_MEMORY_AGENT = create_default_memory_agent()
-    return _DEFAULT_MEMORY_AGENT
+    from agents.memory_agent import create_default_memory_agent
+
+    return create_default_memory_agent()
+
+
+def _apply_memory_updates(
+    storage: MemoryStorage,
+    user_id: str | None,
+    memory_context: MemoryContext,
+    updates: Dict[str, Any],
+) -> MemoryContext:
+    if user_id:
+        storage.apply_memory_update(
+            user_id=user_id,
+            preferred_language=updates.get("preferred_language"),
+            preferred_style_mode=updates.get("preferred_style_mode"),
+            mistakes=[
+                (
+                    mistake.get("category", "general_bug"),
+                    mistake.get("description", "Unspecified mistake"),
+                )
+                for mistake in updates.get("mistakes", [])
+            ],
+        )
 
+    # MemoryContext is frozen; the lists are shared with the old context.
+    return memory_context.model_copy(
+        update={
+            "last_interaction_summary": updates.get("interaction_summary")
+            or "Completed an end-to-end orchestration run."
+        }
+    )
 
-def make_memory_update_node(storage: MemoryStorage) -> Callable[[CoreState], CoreState]:
-    def memory_update(state: CoreState) -> CoreState:
-        started_at = _now_utc()
-        new_state = state.model_copy(deep=True)
 
-        if new_state.memory_context is None:
-            new_state.memory_context = _default_memory_context()
+def make_memory_update_node(storage: MemoryStorage) -> RunnableLambda:
+    def memory_update(state: CoreState) -> StateDelta:
+        started_ns = time.perf_counter_ns()
+        memory_context = state.memory_context or _default_memory_context()
 
         agent = _get_memory_agent()
         updates = agent.extract_updates(
-            intent=new_state.intent_result,
-            testing=new_state.test_result,
-            debug=new_state.debug_result,
-            existing_context=new_state.memory_context,
+            intent=state.intent_result,
+            testing=state.test_result,
+            debug=state.debug_result,
+            existing_context=memory_context,
         )
-
-        new_state.memory_context.last_interaction_summary = (
-            updates.get("interaction_summary")
-            or "Completed an end-to-end orchestration run."
+        memory_context = _apply_memory_updates(
+            storage, state.user_id, memory_context, updates
+        )
+        return _log_step(
+            state, "memory_update", started_ns, {"memory_context": memory_context}
         )
 
-        if new_state.user_id:
-            storage.update_preferences(
-                user_id=new_state.user_id,
-                preferred_language=updates.get("preferred_language"),
-                preferred_style_mode=updates.get("preferred_style_mode"),
-            )
-
-            for mistake in updates.get("mistakes", []):
-                storage.record_mistake(
-                    user_id=new_state.user_id,
-                    category=mistake.get("category", "general_bug"),
-                    description=mistake.get("description", "Unspecified mistake"),
-                )
+    async def amemory_update(state: CoreState) -> StateDelta:
+        started_ns = time.perf_counter_ns()
+        memory_context = state.memory_context or _default_memory_context()
 
-        return _log_step(new_state, "memory_update", started_at)
+        agent = _get_memory_agent()
+        updates = await agent.aextract_updates(
+            intent=state.intent_result,
+            testing=state.test_result,
+            debug=state.debug_result,
+            existing_context=memory_context,
+        )
+        # SQLite writes block, so keep them off the event loop.
+        memory_context = await asyncio.to_thread(
+            _apply_memory_updates, storage, state.user_id, memory_context, updates
+        )
+        return _log_step(
+            state, "memory_update", started_ns, {"memory_context": memory_context}
+        )
 
-    return memory_update
+    return RunnableLambda(memory_update, afunc=amemory_update)
 
 
 # ---------------------------------------------------------------------------
 # Agents
 # ---------------------------------------------------------------------------
 
-_DEFAULT_INTENT_CLASSIFIER: IntentClassifierAgent | None = None
+@_once
+def _get_intent_classifier() -> IntentClassifierAgent:
+    from agents.intent_classifier import create_default_intent_classifier
 
+    return create_default_intent_classifier()
 
-def _get_intent_classifier() -> IntentClassifierAgent:
-    global _DEFAULT_INTENT_CLASSIFIER
-    if _DEFAULT_INTENT_CLASSIFIER is None:
-        _DEFAULT_INTENT_CLASSIFIER = create_default_intent_classifier()
-    return _DEFAULT_INTENT_CLASSIFIER
 
+def _problem_cache_key(state: CoreState) -> str:
+    # Shared by the persisted intent cache and the run cache.
+    payload = f"{state.user_id or ''}\0{state.raw_problem_input}".encode("utf-8")
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
 
-def intent_classifier(state: CoreState) -> CoreState:
-    started_at = _now_utc()
-    new_state = state.model_copy(deep=True)
 
-    agent = _get_intent_classifier()
-    result = agent.classify(
-        raw_problem_input=new_state.raw_problem_input,
-        memory_context=new_state.memory_context,
-    )
-    new_state.intent_result = result
-    return _log_step(new_state, "intent_classifier", started_at)
+def _is_persistable_intent(result: IntentClassificationOutput) -> bool:
+    # Fallback classifications stand in for a failed LLM call and must not
+    # outlive it.
+    return not (result.raw_json or {}).get("fallback")
 
 
-_DEFAULT_PLANNER: EngineeringPlannerAgent | None = None
+def make_intent_classifier_node(storage: MemoryStorage) -> RunnableLambda:
+    """
+    Build the intent node. Classifications are persisted in storage keyed by
+    user and problem text, so a repeated problem skips the LLM call even
+    across restarts. Stored entries are not permanent: the SQLite storage
+    serves them for SQLiteConfig.intent_cache_ttl_seconds (a week by
+    default) and keeps at most intent_cache_max_rows of the newest.
+    """
 
+    def intent_classifier(state: CoreState) -> StateDelta:
+        started_ns = time.perf_counter_ns()
+        cache_key = _problem_cache_key(state)
+        result = storage.get_cached_intent(cache_key)
+        if result is None:
+            agent = _get_intent_classifier()
+            result = agent.classify(
+                raw_problem_input=state.raw_problem_input,
+                memory_context=state.memory_context,
+            )
+            if _is_persistable_intent(result):
+                storage.put_cached_intent(cache_key, result)
+        return _log_step(
+            state, "intent_classifier", started_ns, {"intent_result": result}
+        )
+
+    async def aintent_classifier(state: CoreState) -> StateDelta:
+        started_ns = time.perf_counter_ns()
+        cache_key = _problem_cache_key(state)
+        result = await asyncio.to_thread(storage.get_cached_intent, cache_key)
+        if result is None:
+            agent = _get_intent_classifier()
+            result = await agent.aclassify(
+                raw_problem_input=state.raw_problem_input,
+                memory_context=state.memory_context,
+            )
+            if _is_persistable_intent(result):
+                await asyncio.to_thread(storage.put_cached_intent, cache_key, result)
+        return _log_step(
+            state, "intent_classifier", started_ns, {"intent_result": result}
+        )
+
+    return RunnableLambda(intent_classifier, afunc=aintent_classifier)
 
+
+@_once
 def _get_planner() -> EngineeringPlannerAgent:
-    global _DEFAULT_PLANNER
-    if _DEFAULT_PLANNER is None:
-        _DEFAULT_PLANNER = create_default_engineering_planner()
-    return _DEFAULT_PLANNER
+    from agents.engineering_planner import create_default_engineering_planner
 
+    return create_default_engineering_planner()
 
-def planner(state: CoreState) -> CoreState:
-    started_at = _now_utc()
-    new_state = state.model_copy(deep=True)
 
-    if new_state.intent_result is None:
+def planner(state: CoreState) -> StateDelta:
+    started_ns = time.perf_counter_ns()
+    if state.intent_result is None:
         raise ValueError("planner requires intent_result")
 
     agent = _get_planner()
-    new_state.planning_result = agent.plan(
-        intent=new_state.intent_result,
-        raw_problem_input=new_state.raw_problem_input,
-        memory_context=new_state.memory_context,
+    result = agent.plan(
+        intent=state.intent_result,
+        raw_problem_input=state.raw_problem_input,
+        memory_context=state.memory_context,
     )
-    return _log_step(new_state, "planner", started_at)
+    return _log_step(state, "planner", started_ns, {"planning_result": result})
 
 
-_DEFAULT_CODER: CoderAgent | None = None
+async def aplanner(state: CoreState) -> StateDelta:
+    started_ns = time.perf_counter_ns()
+    if state.intent_result is None:
+        raise ValueError("planner requires intent_result")
 
+    agent = _get_planner()
+    result = await agent.aplan(
+        intent=state.intent_result,
+        raw_problem_input=state.raw_problem_input,
+        memory_context=state.memory_context,
+    )
+    return _log_step(state, "planner", started_ns, {"planning_result": result})
 
+
+@_once
 def _get_coder() -> CoderAgent:
-    global _DEFAULT_CODER
-    if _DEFAULT_CODER is None:
-        _DEFAULT_CODER = create_default_coder()
-    return _DEFAULT_CODER
+    from agents.coder import create_default_coder
 
+    return create_default_coder()
 
-def coder(state: CoreState) -> CoreState:
-    started_at = _now_utc()
-    new_state = state.model_copy(deep=True)
 
+def coder(state: CoreState) -> StateDelta:
+    started_ns = time.perf_counter_ns()
     agent = _get_coder()
-    new_state.code_result = agent.code(
-        planning=new_state.planning_result,
-        intent=new_state.intent_result,
-        debug=new_state.debug_result,
+    result = agent.code(
+        planning=state.planning_result,
+        intent=state.intent_result,
+        debug=state.debug_result,
     )
-    return _log_step(new_state, "coder", started_at)
+    return _log_step(state, "coder", started_ns, {"code_result": result})
 
 
-_DEFAULT_TESTER: AdversarialTesterAgent | None = None
+async def acoder(state: CoreState) -> StateDelta:
+    started_ns = time.perf_counter_ns()
+    agent = _get_coder()
+    result = await agent.acode(
+        planning=state.planning_result,
+        intent=state.intent_result,
+        debug=state.debug_result,
+    )
+    return _log_step(state, "coder", started_ns, {"code_result": result})
 
 
+@_once
 def _get_tester() -> AdversarialTesterAgent:
-    global _DEFAULT_TESTER
-    if _DEFAULT_TESTER is None:
-        _DEFAULT_TESTER = create_default_adversarial_tester()
-    return _DEFAULT_TESTER
+    from agents.adversarial_tester import create_default_adversarial_tester
 
+    return create_default_adversarial_tester()
 
-def tester(state: CoreState) -> CoreState:
-    started_at = _now_utc()
-    new_state = state.model_copy(deep=True)
 
+def tester(state: CoreState) -> StateDelta:
+    started_ns = time.perf_counter_ns()
     agent = _get_tester()
-    new_state.test_result = agent.test(
-        planning=new_state.planning_result,
-        code=new_state.code_result,
-        intent=new_state.intent_result,
+    result = agent.test(
+        planning=state.planning_result,
+        code=state.code_result,
+        intent=state.intent_result,
     )
-    return _log_step(new_state, "tester", started_at)
+    return _log_step(state, "tester", started_ns, {"test_result": result})
 
 
-_DEFAULT_DEBUGGER: DebuggerAgent | None = None
+async def atester(state: CoreState) -> StateDelta:
+    started_ns = time.perf_counter_ns()
+    agent = _get_tester()
+    result = await agent.atest(
+        planning=state.planning_result,
+        code=state.code_result,
+        intent=state.intent_result,
+    )
+    return _log_step(state, "tester", started_ns, {"test_result": result})
 
 
+@_once
 def _get_debugger() -> DebuggerAgent:
-    global _DEFAULT_DEBUGGER
-    if _DEFAULT_DEBUGGER is None:
-        _DEFAULT_DEBUGGER = create_default_debugger()
-    return _DEFAULT_DEBUGGER
+    from agents.debugger import create_default_debugger
 
+    return create_default_debugger()
 
-def debugger(state: CoreState) -> CoreState:
-    started_at = _now_utc()
-    new_state = state.model_copy(deep=True)
 
+def debugger(state: CoreState) -> StateDelta:
+    started_ns = time.perf_counter_ns()
     agent = _get_debugger()
-    new_state.debug_result = agent.debug(
-        testing=new_state.test_result,
-        planning=new_state.planning_result,
-        code=new_state.code_result,
+    result = agent.debug(
+        testing=state.test_result,
+        planning=state.planning_result,
+        code=state.code_result,
     )
-    return _log_step(new_state, "debugger", started_at)
+    return _log_step(
+        state,
+        "debugger",
+        started_ns,
+        {"debug_result": result, "debug_iterations": state.debug_iterations + 1},
+    )
+
+
+async def adebugger(state: CoreState) -> StateDelta:
+    started_ns = time.perf_counter_ns()
+    agent = _get_debugger()
+    result = await agent.adebug(
+        testing=state.test_result,
+        planning=state.planning_result,
+        code=state.code_result,
+    )
+    return _log_step(
+        state,
+        "debugger",
+        started_ns,
+        {"debug_result": result, "debug_iterations": state.debug_iterations + 1},
+    )
+
+
+def warm_up_agents() -> None:
+    """
+    Build every agent up front so the first request does not pay for client
+    construction.
+    """
+    _get_memory_agent()
+    _get_intent_classifier()
+    _get_planner()
+    _get_coder()
+    _get_tester()
+    _get_debugger()
 
 
 # ---------------------------------------------------------------------------
@@ -304,7 +496,7 @@ def _route_after_tester(state: CoreState) -> str:
     if state.test_result.overall_status == OverallTestStatus.ALL_PASSED:
         return "memory_update"
 
-    if _count_debug_iterations(state) >= MAX_DEBUG_ITERATIONS:
+    if state.debug_iterations >= MAX_DEBUG_ITERATIONS:
         return "memory_update"
 
     return "debugger"
@@ -314,11 +506,13 @@ def build_orchestration_graph(storage: MemoryStorage) -> StateGraph:
     graph: StateGraph[CoreState] = StateGraph(CoreState)
 
     graph.add_node("memory_load", make_memory_load_node(storage))
-    graph.add_node("intent_classifier", intent_classifier)
-    graph.add_node("planner", planner)
-    graph.add_node("coder", coder)
-    graph.add_node("tester", tester)
-    graph.add_node("debugger", debugger)
+    # Every node has a sync and an async variant: invoke() uses the sync one
+    # and ainvoke() awaits the async one.
+    graph.add_node("intent_classifier", make_intent_classifier_node(storage))
+    graph.add_node("planner", RunnableLambda(planner, afunc=aplanner))
+    graph.add_node("coder", RunnableLambda(coder, afunc=acoder))
+    graph.add_node("tester", RunnableLambda(tester, afunc=atester))
+    graph.add_node("debugger", RunnableLambda(debugger, afunc=adebugger))
     graph.add_node("memory_update", make_memory_update_node(storage))
 
     graph.add_edge(START, "memory_load")
@@ -342,10 +536,164 @@ def build_orchestration_graph(storage: MemoryStorage) -> StateGraph:
     return graph
 
 
-def compile_orchestration_graph(storage: MemoryStorage) -> Callable[[CoreState], CoreState]:
-    graph = build_orchestration_graph(storage)
-    app = graph.compile()
-    return lambda state: app.invoke(state)
+# Compiled graphs keyed by id(storage). A compiled graph references its
+# storage through the memory nodes, so an id cannot be reused while its entry
+# is cached; the bound keeps short-lived storages from accumulating.
+_COMPILED_GRAPHS: LRUCache[Any] = LRUCache(maxsize=8)
+
+
+def _compiled_graph(storage: MemoryStorage) -> Any:
+    app = _COMPILED_GRAPHS.get(id(storage))
+    if app is None:
+        app = build_orchestration_graph(storage).compile()
+        _COMPILED_GRAPHS.put(id(storage), app)
+    return app
+
+
+def _from_run_cache(
+    result_cache: LRUCache[CoreState] | None, state: CoreState
+) -> CoreState | None:
+    if result_cache is None:
+        return None
+    cached = result_cache.get(_problem_cache_key(state))
+    if cached is None:
+        return None
+    # Shallow copy: the agent outputs are shared, only the request id differs.
+    return cached.model_copy(update={"request_id": state.request_id})
+
+
+def _to_run_cache(
+    result_cache: LRUCache[CoreState] | None, state: CoreState
+) -> None:
+    # Only passing runs are kept: a user resubmitting a failed problem is
+    # retrying it and must get a fresh run.
+    if result_cache is None or state.test_result is None:
+        return
+    if state.test_result.overall_status == OverallTestStatus.ALL_PASSED:
+        result_cache.put(_problem_cache_key(state), state)
+
+
+def compile_orchestration_graph(
+    storage: MemoryStorage,
+    result_cache: LRUCache[CoreState] | None = None,
+) -> Callable[[CoreState], CoreState]:
+    """
+    Compile the graph into a callable that runs one problem.
+
+    With a result_cache, a problem the same user already solved with all
+    tests passing is answered from the cache without running any node;
+    entries expire with the cache's TTL.
+    """
+    app = _compiled_graph(storage)
+
+    def run(state: CoreState) -> CoreState:
+        cached = _from_run_cache(result_cache, state)
+        if cached is not None:
+            return cached
+        # The compiled graph returns its channel values as a dict; they were
+        # validated on the way in, so the state is rebuilt without
+        # re-validating.
+        final_state = CoreState.model_construct(**app.invoke(state))
+        _to_run_cache(result_cache, final_state)
+        return final_state
+
+    return run
+
+
+def compile_async_orchestration_graph(
+    storage: MemoryStorage,
+    result_cache: LRUCache[CoreState] | None = None,
+) -> Callable[[CoreState], Awaitable[CoreState]]:
+    """
+    Async counterpart of compile_orchestration_graph: LLM calls go through
+    the agents' async clients, so a run does not hold a worker thread while
+    it waits on the network.
+    """
+    app = _compiled_graph(storage)
+
+    async def run(state: CoreState) -> CoreState:
+        cached = _from_run_cache(result_cache, state)
+        if cached is not None:
+            return cached
+        final_state = CoreState.model_construct(**await app.ainvoke(state))
+        _to_run_cache(result_cache, final_state)
+        return final_state
+
+    return run
+
+
+def compile_batch_orchestration_graph(
+    storage: MemoryStorage,
+    max_concurrency: int = BATCH_MAX_CONCURRENCY,
+) -> Callable[[Sequence[CoreState]], List[CoreState]]:
+    """
+    Batch counterpart of compile_orchestration_graph for offline sweeps: the
+    compiled graph's batch() runs up to max_concurrency problems at a time,
+    so their LLM calls overlap instead of running one problem after another.
+    """
+    app = _compiled_graph(storage)
+
+    def run_batch(states: Sequence[CoreState]) -> List[CoreState]:
+        results = app.batch(list(states), config={"max_concurrency": max_concurrency})
+        return [CoreState.model_construct(**result) for result in results]
+
+    return run_batch
+
+
+def _apply_delta(state: CoreState, delta: StateDelta) -> CoreState:
+    # Mirrors the graph's channels: execution_log goes through its reducer,
+    # every other key replaces the field.
+    if "execution_log" in delta:
+        delta = dict(delta)
+        delta["execution_log"] = state.execution_log + delta["execution_log"]
+    return state.model_copy(update=delta)
+
+
+def compile_orchestration_graph_fast(
+    storage: MemoryStorage,
+) -> Callable[[CoreState], CoreState]:
+    """
+    Run the same pipeline as compile_orchestration_graph as plain control
+    flow, without LangGraph's Pregel runtime.
+
+    The graph is a fixed chain with one conditional edge, so the supersteps
+    and channel bookkeeping buy nothing on the happy path. Use the compiled
+    graph when checkpointing or interrupts are needed.
+    """
+    memory_load = make_memory_load_node(storage).func
+    intent_classifier = make_intent_classifier_node(storage).func
+    memory_update = make_memory_update_node(storage).func
+
+    def run(state: CoreState) -> CoreState:
+        for node in (memory_load, intent_classifier, planner, coder, tester):
+            state = _apply_delta(state, node(state))
+        while _route_after_tester(state) == "debugger":
+            for node in (debugger, coder, tester):
+                state = _apply_delta(state, node(state))
+        return _apply_delta(state, memory_update(state))
+
+    return run
+
+
+def compile_async_orchestration_graph_fast(
+    storage: MemoryStorage,
+) -> Callable[[CoreState], Awaitable[CoreState]]:
+    """
+    Async counterpart of compile_orchestration_graph_fast.
+    """
+    amemory_load = make_memory_load_node(storage).afunc
+    aintent_classifier = make_intent_classifier_node(storage).afunc
+    amemory_update = make_memory_update_node(storage).afunc
+
+    async def run(state: CoreState) -> CoreState:
+        for node in (amemory_load, aintent_classifier, aplanner, acoder, atester):
+            state = _apply_delta(state, await node(state))
+        while _route_after_tester(state) == "debugger":
+            for node in (adebugger, acoder, atester):
+                state = _apply_delta(state, await node(state))
+        return _apply_delta(state, await amemory_update(state))
+
+    return run
 
 
 def create_default_sqlite_storage(db_path: str | Path) -> SQLiteMemoryStorage:
@@ -1,10 +1,15 @@
 from __future__ import annotations
+import operator
+from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Optional
+from typing import Annotated, List, Optional
 from pydantic import BaseModel, Field
 
 
-class StepLogEntry(BaseModel):
+@dataclass(slots=True, frozen=True)
+class StepLogEntry:
+    # A plain slotted dataclass: entries pile up across debugger loops and are
+    # only ever built from trusted values in orchestration._log_step.
     step_name: str
     started_at: datetime
     finished_at: datetime
@@ -27,4 +32,10 @@ class CoreState(BaseModel):
     debug_result: Optional[object] = None
     memory_context: Optional[object] = None
 
-    execution_log: List[StepLogEntry] = Field(default_factory=list)
+    debug_iterations: int = 0
+
+    # LangGraph reducer: nodes return only their new entries and the graph
+    # appends them.
+    execution_log: Annotated[List[StepLogEntry], operator.add] = Field(
+        default_factory=list
+    )
@@ -1,36 +1,265 @@
+import json
+import logging
+import queue
 import sqlite3
+import threading
+from contextlib import contextmanager
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, List, Optional, Sequence, Tuple
 
-from core.models import MemoryContext, StyleMode
+from core.cache import LRUCache
+from core.models import IntentClassificationOutput, MemoryContext, StyleMode
 
 from memory.storage_base import MemoryStorage
 
 
 @dataclass
 class SQLiteConfig:
-    """Configuration for SQLiteMemoryStorage."""
+    """
+    Configuration for SQLiteMemoryStorage.
+
+    The pragmas are applied to the shared connection when it is opened. WAL
+    lets readers proceed while a write is in progress; with WAL,
+    synchronous=NORMAL skips the fsync on every commit and stays consistent
+    (a power loss can drop only the most recent commits).
+
+    Reads go through a small pool of read-only connections so they do not
+    queue behind the write lock.
+
+    Attributes:
+        db_path: Path of the database file.
+        journal_mode: SQLite journal mode; use "DELETE" on network
+            filesystems, where WAL is unsupported.
+        synchronous: SQLite synchronous level.
+        temp_store: Where temporary tables and indices are kept.
+        mmap_size: Bytes of the database file to memory-map; 0 disables it.
+        cache_size: Page cache size; negative values are in KiB.
+        read_pool_size: Number of read-only connections; 0 sends reads
+            through the shared write connection.
+        write_behind: When True, apply_memory_update queues its writes for a
+            background writer thread and returns at once. The writer commits
+            everything queued in one transaction; a read issued right after
+            may not see the update yet, and close() flushes the queue.
+        context_cache_size: Number of users whose MemoryContext is kept in
+            process; 0 disables the cache.
+        context_cache_ttl_seconds: How long a cached context is served.
+            Writes through this storage invalidate it immediately; the TTL
+            bounds staleness from writers in other processes.
+        intent_cache_ttl_seconds: How long a stored intent classification is
+            served; older rows are ignored and pruned.
+        intent_cache_max_rows: Maximum number of stored intent
+            classifications; the oldest rows are pruned beyond it.
+    """
     db_path: Path
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    temp_store: str = "MEMORY"
+    mmap_size: int = 268_435_456
+    cache_size: int = -20_000
+    read_pool_size: int = 4
+    write_behind: bool = False
+    context_cache_size: int = 10_000
+    context_cache_ttl_seconds: float = 60.0
+    intent_cache_ttl_seconds: float = 7 * 24 * 3600.0
+    intent_cache_max_rows: int = 10_000
+
+    def connection_pragmas(self) -> Tuple[str, ...]:
+        return (
+            f"PRAGMA journal_mode={self.journal_mode}",
+            f"PRAGMA synchronous={self.synchronous}",
+        ) + self.reader_pragmas()
+
+    def reader_pragmas(self) -> Tuple[str, ...]:
+        # journal_mode and synchronous are set by the write connection.
+        return (
+            f"PRAGMA temp_store={self.temp_store}",
+            f"PRAGMA mmap_size={self.mmap_size}",
+            f"PRAGMA cache_size={self.cache_size}",
+        )
+
+
+_UPSERT_PREFERENCES_SQL = """
+    INSERT INTO user_contexts (user_id, preferred_language, preferred_style_mode)
+    VALUES (
+        :user_id,
+        COALESCE(:language, :default_language),
+        COALESCE(:style_mode, :default_style_mode)
+    )
+    ON CONFLICT(user_id) DO UPDATE SET
+        preferred_language = COALESCE(:language, preferred_language),
+        preferred_style_mode = COALESCE(:style_mode, preferred_style_mode)
+"""
+
+
+# Drops intent_cache rows past the TTL, then everything older than the
+# max_rows newest; both walk idx_intent_cache_created.
+_PRUNE_INTENT_CACHE_SQL = (
+    "DELETE FROM intent_cache WHERE created_at < datetime('now', :max_age)",
+    """DELETE FROM intent_cache WHERE created_at <= (
+           SELECT created_at FROM intent_cache
+           ORDER BY created_at DESC LIMIT 1 OFFSET :max_rows
+       )""",
+)
+
+
+_logger = logging.getLogger(__name__)
+
+
+def _decode_list(value: Optional[str]) -> List[str]:
+    """
+    Decode a list column (common_mistakes, repeated_weaknesses). The read side
+    accepts JSON arrays, whose items may contain commas, as well as the
+    comma-separated text the columns hold today; a value that only looks like
+    JSON falls back to the comma split.
+    """
+    if not value:
+        return []
+    if value.startswith("["):
+        try:
+            decoded = json.loads(value)
+        except ValueError:
+            pass
+        else:
+            if isinstance(decoded, list):
+                return [str(item) for item in decoded]
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+# (user_id, preferred_language, preferred_style_mode, mistakes)
+_MemoryWrite = Tuple[str, Optional[str], Optional[StyleMode], Tuple[Tuple[str, str], ...]]
 
 
 class SQLiteMemoryStorage(MemoryStorage):
     """
     SQLite-based implementation of MemoryStorage.
     
-    Stores user memory context in a SQLite database.
+    Stores user memory context in a SQLite database. One write connection is
+    opened per storage and shared across threads; a lock serializes its use,
+    since a sqlite3 connection must not run statements concurrently. Reads
+    borrow a connection from a pool of read-only ones instead.
     """
 
     def __init__(self, config: SQLiteConfig):
         self.config = config
+        db_path = Path(self.config.db_path)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit mode: writes open their own BEGIN IMMEDIATE transaction
+        # (see _transaction) instead of relying on sqlite3's implicit BEGIN.
+        self._conn = sqlite3.connect(
+            str(db_path), check_same_thread=False, isolation_level=None
+        )
+        self._lock = threading.Lock()
+        # MemoryContext is frozen, so cached instances can be shared.
+        self._contexts: Optional[LRUCache[MemoryContext]] = None
+        if self.config.context_cache_size > 0:
+            self._contexts = LRUCache(
+                maxsize=self.config.context_cache_size,
+                ttl_seconds=self.config.context_cache_ttl_seconds,
+            )
+        for pragma in self.config.connection_pragmas():
+            self._conn.execute(pragma)
         self._init_db()
 
+        # Opened after _init_db: a read-only connection needs the file to exist.
+        self._reader_conns: List[sqlite3.Connection] = [
+            self._open_reader(db_path) for _ in range(self.config.read_pool_size)
+        ]
+        self._readers: "queue.SimpleQueue[sqlite3.Connection]" = queue.SimpleQueue()
+        for conn in self._reader_conns:
+            self._readers.put(conn)
+
+        self._write_queue: Optional["queue.SimpleQueue[Optional[_MemoryWrite]]"] = None
+        self._writer: Optional[threading.Thread] = None
+        if self.config.write_behind:
+            self._write_queue = queue.SimpleQueue()
+            self._writer = threading.Thread(
+                target=self._drain_writes,
+                name="sqlite-write-behind",
+                daemon=True,
+            )
+            self._writer.start()
+
+    def _open_reader(self, db_path: Path) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            f"{db_path.resolve().as_uri()}?mode=ro",
+            uri=True,
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        for pragma in self.config.reader_pragmas():
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def _reader(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a read-only connection, or the write connection if none."""
+        if not self._reader_conns:
+            with self._lock:
+                yield self._conn
+            return
+
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Hold the connection lock and run the body in one write transaction.
+
+        BEGIN IMMEDIATE takes SQLite's write lock up front, so a transaction
+        that starts by reading cannot fail later with SQLITE_BUSY while
+        upgrading to a writer.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            else:
+                self._conn.execute("COMMIT")
+
+    def warm_up(self) -> None:
+        """Read the tables once so their pages are cached before traffic."""
+        with self._lock:
+            self._warm_connection(self._conn)
+
+        # Each connection has its own page cache, so warm every reader.
+        borrowed = [self._readers.get() for _ in self._reader_conns]
+        try:
+            for conn in borrowed:
+                self._warm_connection(conn)
+        finally:
+            for conn in borrowed:
+                self._readers.put(conn)
+
+    @staticmethod
+    def _warm_connection(conn: sqlite3.Connection) -> None:
+        conn.execute("SELECT COUNT(*) FROM user_contexts").fetchone()
+        conn.execute("SELECT COUNT(*) FROM user_mistakes").fetchone()
+
+    def close(self) -> None:
+        """
+        Flush queued writes, let SQLite refresh its query planner statistics,
+        then close.
+        """
+        if self._writer is not None:
+            self._write_queue.put(None)
+            self._writer.join()
+        with self._lock:
+            for conn in self._reader_conns:
+                conn.close()
+            self._conn.execute("PRAGMA optimize")
+            self._conn.close()
+
     def _init_db(self) -> None:
         """Initialize the database schema if it doesn't exist."""
-        db_path = Path(self.config.db_path)
-        db_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        with sqlite3.connect(str(db_path)) as conn:
+        with self._transaction() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS user_contexts (
@@ -52,50 +281,81 @@ class SQLiteMemoryStorage(MemoryStorage):
                     FOREIGN KEY (user_id) REFERENCES user_contexts(user_id)
                 )
             """)
-            conn.commit()
+            # Also serves lookups by user_id alone (leading column).
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_user_mistakes_user_cat
+                ON user_mistakes(user_id, category)
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS intent_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    output_json TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_intent_cache_created
+                ON intent_cache(created_at)
+            """)
+            self._prune_intent_cache(cursor)
+
+        # Give the query planner statistics once; close() keeps them fresh
+        # with PRAGMA optimize afterwards.
+        with self._lock:
+            has_stats = self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+            ).fetchone()
+            if has_stats is None:
+                self._conn.execute("ANALYZE")
 
     def load_context(self, user_id: str) -> Optional[MemoryContext]:
         """Load the memory context for a given user."""
-        with sqlite3.connect(str(self.config.db_path)) as conn:
-            conn.row_factory = sqlite3.Row
+        if self._contexts is None:
+            return self._read_context(user_id)
+
+        context = self._contexts.get(user_id)
+        if context is None:
+            context = self._read_context(user_id)
+            if context is not None:
+                self._contexts.put(user_id, context)
+        return context
+
+    def _invalidate_contexts(self, user_ids: Sequence[str]) -> None:
+        # Called after the write commits. A load that read the old row just
+        # before the commit can still re-cache it; the TTL bounds that.
+        if self._contexts is not None:
+            for user_id in user_ids:
+                self._contexts.pop(user_id)
+
+    def _read_context(self, user_id: str) -> Optional[MemoryContext]:
+        with self._reader() as conn:
             cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
             cursor.execute(
                 "SELECT * FROM user_contexts WHERE user_id = ?",
                 (user_id,)
             )
             row = cursor.fetchone()
-            
-            if row is None:
-                return None
-            
-            # Parse stored data
-            preferred_language = row["preferred_language"] or "python"
-            preferred_style_mode_str = row["preferred_style_mode"]
-            preferred_style_mode = (
-                StyleMode(preferred_style_mode_str)
-                if preferred_style_mode_str
-                else StyleMode.READABLE
-            )
-            
-            # Parse JSON-like lists (stored as comma-separated strings for simplicity)
-            common_mistakes = (
-                row["common_mistakes"].split(",")
-                if row["common_mistakes"]
-                else []
-            )
-            repeated_weaknesses = (
-                row["repeated_weaknesses"].split(",")
-                if row["repeated_weaknesses"]
-                else []
-            )
-            
-            return MemoryContext(
-                preferred_language=preferred_language,
-                preferred_style_mode=preferred_style_mode,
-                common_mistakes=[m.strip() for m in common_mistakes if m.strip()],
-                repeated_weaknesses=[w.strip() for w in repeated_weaknesses if w.strip()],
-                last_interaction_summary=row["last_interaction_summary"],
-            )
+
+        if row is None:
+            return None
+
+        # Parse stored data
+        preferred_language = row["preferred_language"] or "python"
+        preferred_style_mode_str = row["preferred_style_mode"]
+        preferred_style_mode = (
+            StyleMode(preferred_style_mode_str)
+            if preferred_style_mode_str
+            else StyleMode.READABLE
+        )
+        
+        return MemoryContext(
+            preferred_language=preferred_language,
+            preferred_style_mode=preferred_style_mode,
+            common_mistakes=_decode_list(row["common_mistakes"]),
+            repeated_weaknesses=_decode_list(row["repeated_weaknesses"]),
+            last_interaction_summary=row["last_interaction_summary"],
+        )
 
     def update_preferences(
         self,
@@ -104,46 +364,32 @@ class SQLiteMemoryStorage(MemoryStorage):
         preferred_style_mode: Optional[StyleMode] = None,
     ) -> None:
         """Update user preferences."""
-        with sqlite3.connect(str(self.config.db_path)) as conn:
-            cursor = conn.cursor()
-            
-            # Check if user exists
-            cursor.execute(
-                "SELECT user_id FROM user_contexts WHERE user_id = ?",
-                (user_id,)
+        with self._transaction() as conn:
+            self._write_preferences(
+                conn.cursor(), user_id, preferred_language, preferred_style_mode
             )
-            exists = cursor.fetchone() is not None
-            
-            if exists:
-                updates = []
-                params = []
-                if preferred_language is not None:
-                    updates.append("preferred_language = ?")
-                    params.append(preferred_language)
-                if preferred_style_mode is not None:
-                    updates.append("preferred_style_mode = ?")
-                    params.append(preferred_style_mode.value)
-                
-                if updates:
-                    params.append(user_id)
-                    cursor.execute(
-                        f"UPDATE user_contexts SET {', '.join(updates)} WHERE user_id = ?",
-                        params
-                    )
-            else:
-                # Create new user context
-                cursor.execute(
-                    """INSERT INTO user_contexts 
-                       (user_id, preferred_language, preferred_style_mode)
-                       VALUES (?, ?, ?)""",
-                    (
-                        user_id,
-                        preferred_language or "python",
-                        preferred_style_mode.value if preferred_style_mode else StyleMode.READABLE.value,
-                    )
-                )
-            
-            conn.commit()
+        self._invalidate_contexts((user_id,))
+
+    def _write_preferences(
+        self,
+        cursor: sqlite3.Cursor,
+        user_id: str,
+        preferred_language: Optional[str],
+        preferred_style_mode: Optional[StyleMode],
+    ) -> None:
+        # Caller holds self._lock inside a transaction.
+        # One upsert: a new user gets the defaults for unset fields; an
+        # existing user keeps the stored value of any field passed as None.
+        cursor.execute(
+            _UPSERT_PREFERENCES_SQL,
+            {
+                "user_id": user_id,
+                "language": preferred_language,
+                "style_mode": preferred_style_mode.value if preferred_style_mode else None,
+                "default_language": "python",
+                "default_style_mode": StyleMode.READABLE.value,
+            },
+        )
 
     def record_mistake(
         self,
@@ -152,11 +398,115 @@ class SQLiteMemoryStorage(MemoryStorage):
         description: str,
     ) -> None:
         """Record a mistake for a user."""
-        with sqlite3.connect(str(self.config.db_path)) as conn:
+        with self._transaction() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """INSERT INTO user_mistakes (user_id, category, description)
                    VALUES (?, ?, ?)""",
                 (user_id, category, description)
             )
-            conn.commit()
+
+    def apply_memory_update(
+        self,
+        user_id: str,
+        preferred_language: Optional[str] = None,
+        preferred_style_mode: Optional[StyleMode] = None,
+        mistakes: Sequence[Tuple[str, str]] = (),
+    ) -> None:
+        """
+        Update preferences and record mistakes in a single transaction, or
+        queue them for the writer thread when write_behind is enabled.
+        """
+        write: _MemoryWrite = (
+            user_id,
+            preferred_language,
+            preferred_style_mode,
+            tuple(mistakes),
+        )
+        if self._write_queue is not None:
+            self._write_queue.put(write)
+            return
+
+        with self._transaction() as conn:
+            self._apply_write(conn, write)
+        self._invalidate_contexts((user_id,))
+
+    def _apply_write(self, conn: sqlite3.Connection, write: _MemoryWrite) -> None:
+        # Caller holds self._lock inside a transaction.
+        user_id, preferred_language, preferred_style_mode, mistakes = write
+        self._write_preferences(
+            conn.cursor(), user_id, preferred_language, preferred_style_mode
+        )
+        if mistakes:
+            conn.executemany(
+                """INSERT INTO user_mistakes (user_id, category, description)
+                   VALUES (?, ?, ?)""",
+                [(user_id, category, description) for category, description in mistakes],
+            )
+
+    def _drain_writes(self) -> None:
+        """
+        Writer thread body: commit whatever has been queued as one
+        transaction, until close() enqueues None.
+        """
+        assert self._write_queue is not None
+        while True:
+            batch = [self._write_queue.get()]
+            while not self._write_queue.empty():
+                batch.append(self._write_queue.get())
+
+            stop = None in batch
+            writes = [write for write in batch if write is not None]
+            if writes:
+                try:
+                    with self._transaction() as conn:
+                        for write in writes:
+                            self._apply_write(conn, write)
+                    self._invalidate_contexts([write[0] for write in writes])
+                except Exception:
+                    # Memory updates are best effort; keep the writer alive.
+                    _logger.exception("Dropped %d queued memory writes", len(writes))
+            if stop:
+                return
+
+    def _intent_cache_max_age(self) -> str:
+        return f"-{int(self.config.intent_cache_ttl_seconds)} seconds"
+
+    def _prune_intent_cache(self, cursor: sqlite3.Cursor) -> None:
+        params = {
+            "max_age": self._intent_cache_max_age(),
+            "max_rows": self.config.intent_cache_max_rows,
+        }
+        for sql in _PRUNE_INTENT_CACHE_SQL:
+            cursor.execute(sql, params)
+
+    def get_cached_intent(self, cache_key: str) -> Optional[IntentClassificationOutput]:
+        """Load a stored intent classification that has not expired."""
+        with self._reader() as conn:
+            row = conn.execute(
+                """SELECT output_json FROM intent_cache
+                   WHERE cache_key = ? AND created_at >= datetime('now', ?)""",
+                (cache_key, self._intent_cache_max_age()),
+            ).fetchone()
+
+        if row is None:
+            return None
+        return IntentClassificationOutput.model_validate_json(row[0])
+
+    def put_cached_intent(
+        self,
+        cache_key: str,
+        output: IntentClassificationOutput,
+    ) -> None:
+        """
+        Store an intent classification, replacing any previous one, and
+        prune expired rows and rows beyond intent_cache_max_rows.
+        """
+        with self._transaction() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """INSERT OR REPLACE INTO intent_cache (cache_key, output_json)
+                   VALUES (?, ?)""",
+                (cache_key, output.model_dump_json()),
+            )
+            self._prune_intent_cache(cursor)
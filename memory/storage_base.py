@@ -1,7 +1,7 @@
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import Optional, Sequence, Tuple
 
-from core.models import MemoryContext, StyleMode
+from core.models import IntentClassificationOutput, MemoryContext, StyleMode
 
 
 class MemoryStorage(ABC):
@@ -57,3 +57,63 @@ class MemoryStorage(ABC):
             description: Description of the mistake
         """
         pass
+
+    def apply_memory_update(
+        self,
+        user_id: str,
+        preferred_language: Optional[str] = None,
+        preferred_style_mode: Optional[StyleMode] = None,
+        mistakes: Sequence[Tuple[str, str]] = (),
+    ) -> None:
+        """
+        Update preferences and record mistakes for a user in one call.
+
+        Backends that support transactions should override this to apply every
+        write atomically; the default delegates to update_preferences and
+        record_mistake.
+
+        Args:
+            user_id: Unique identifier for the user
+            preferred_language: Preferred programming language
+            preferred_style_mode: Preferred code style mode
+            mistakes: (category, description) pairs to record
+        """
+        self.update_preferences(
+            user_id=user_id,
+            preferred_language=preferred_language,
+            preferred_style_mode=preferred_style_mode,
+        )
+        for category, description in mistakes:
+            self.record_mistake(
+                user_id=user_id,
+                category=category,
+                description=description,
+            )
+
+    def get_cached_intent(self, cache_key: str) -> Optional[IntentClassificationOutput]:
+        """
+        Look up a previously stored intent classification.
+
+        Backends without a persistent cache inherit this default, which always
+        misses.
+
+        Args:
+            cache_key: Digest identifying the user and problem text
+
+        Returns:
+            The stored IntentClassificationOutput, or None
+        """
+        return None
+
+    def put_cached_intent(
+        self,
+        cache_key: str,
+        output: IntentClassificationOutput,
+    ) -> None:
+        """
+        Store an intent classification for later get_cached_intent calls.
+
+        Args:
+            cache_key: Digest identifying the user and problem text
+            output: Classification to store
+        """
@@ -0,0 +1,58 @@
+import time
+
+from agents.adversarial_tester import (
+    AdversarialTesterAgent,
+    AdversarialTesterConfig,
+    _compile_source_files,
+)
+from core.models import CodeOutput, StyleMode, TestCase, TestCaseType
+
+
+_PER_TEST_TIMEOUT_SECONDS = 1.0
+
+_SPIN_SOURCE = (
+    "def solve(input_data):\n"
+    "    while True:\n"
+    "        pass\n"
+)
+
+
+def _case(case_id: str) -> TestCase:
+    return TestCase(
+        id=case_id,
+        description="never returns",
+        input_payload=None,
+        expected_behavior="times out",
+        type=TestCaseType.STRESS,
+    )
+
+
+def test_parallel_timeouts_share_one_budget():
+    agent = AdversarialTesterAgent(
+        client=None,
+        config=AdversarialTesterConfig(
+            per_test_timeout_seconds=_PER_TEST_TIMEOUT_SECONDS
+        ),
+    )
+    code = CodeOutput(
+        language="python",
+        style_mode=StyleMode.READABLE,
+        source_files={"solution.py": _SPIN_SOURCE},
+        entrypoint="solution.solve",
+        notes_for_tester=[],
+    )
+    compiled = _compile_source_files(code.source_files)
+    outcomes = {}
+
+    # Two workers, so both cases run at once regardless of the host's cores.
+    started = time.monotonic()
+    agent._run_pending(code, [_case("a"), _case("b")], compiled, 2, outcomes)
+    elapsed = time.monotonic() - started
+
+    assert outcomes == {
+        "a": ("timeout", None, None),
+        "b": ("timeout", None, None),
+    }
+    # Each case is timed from its own start, so two stuck cases running side
+    # by side cost one budget, not two.
+    assert elapsed < 2 * _PER_TEST_TIMEOUT_SECONDS